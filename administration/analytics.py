@@ -0,0 +1,122 @@
+# administration/analytics.py
+
+import atexit
+import logging
+import threading
+import time
+from datetime import date
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+
+from .models import ContentAnalytics, Course
+
+FLUSH_INTERVAL = getattr(settings, 'ANALYTICS_FLUSH_INTERVAL', 10)
+FLUSH_MAX_PENDING = getattr(settings, 'ANALYTICS_FLUSH_MAX_PENDING', 1000)
+COUNTERS = ('views', 'downloads', 'completions')
+
+logger = logging.getLogger(__name__)
+
+
+class AnalyticsBuffer:
+    """Write-behind buffer of ContentAnalytics increments.
+
+    Hits are summed in memory per (course, day) and written with one F()
+    update per row when the buffer reaches ``max_pending`` rows, every
+    ``interval`` seconds and at interpreter exit. Failed flushes are put
+    back in the buffer, so every hit is written at least once.
+    """
+
+    def __init__(self, interval=FLUSH_INTERVAL, max_pending=FLUSH_MAX_PENDING):
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, course_id, views=0, downloads=0, completions=0, day=None):
+        # Même jour que la valeur par défaut de ContentAnalytics.date
+        key = (course_id, day or date.today())
+        with self._lock:
+            self._merge(key, (views, downloads, completions))
+            full = len(self._pending) >= self.max_pending
+        self._ensure_timer()
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Write every pending increment; returns the number of rows touched"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            try:
+                write_increments(pending)
+            except Exception:
+                # Remettre les compteurs en file pour la prochaine tentative
+                with self._lock:
+                    for key, counts in pending.items():
+                        self._merge(key, counts)
+                raise
+            return len(pending)
+
+    def _merge(self, key, counts):
+        old = self._pending.get(key, (0, 0, 0))
+        self._pending[key] = tuple(a + b for a, b in zip(old, counts))
+
+    def _ensure_timer(self):
+        if self._timer is None:
+            with self._lock:
+                if self._timer is None:
+                    self._timer = threading.Thread(target=self._run, name='analytics-flush', daemon=True)
+                    self._timer.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Échec de l'écriture de %d ligne(s) de statistiques", len(self))
+            finally:
+                close_old_connections()
+
+
+def write_increments(pending):
+    """Add {(course_id, day): (views, downloads, completions)} to ContentAnalytics in one transaction"""
+    # Ignorer les cours supprimés depuis l'enregistrement des visites
+    live_courses = set(
+        Course.objects.filter(pk__in={course_id for course_id, _ in pending}).values_list('pk', flat=True)
+    )
+    with transaction.atomic():
+        for (course_id, day), counts in pending.items():
+            if course_id not in live_courses:
+                continue
+            increments = {field: F(field) + value for field, value in zip(COUNTERS, counts) if value}
+            rows = ContentAnalytics.objects.filter(course_id=course_id, date=day)
+            if increments and rows.update(**increments):
+                continue
+            if rows.exists():
+                continue
+            try:
+                with transaction.atomic():
+                    ContentAnalytics.objects.create(course_id=course_id, date=day, **dict(zip(COUNTERS, counts)))
+            except IntegrityError:
+                # Ligne du jour créée entre-temps par un autre processus
+                if increments:
+                    rows.update(**increments)
+
+
+analytics_buffer = AnalyticsBuffer()
+atexit.register(analytics_buffer.flush)
+
+
+def record_content_hit(course, views=0, downloads=0, completions=0):
+    """Count views/downloads/completions of a course without writing in the request"""
+    analytics_buffer.add(getattr(course, 'pk', course), views, downloads, completions)
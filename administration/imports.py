@@ -0,0 +1,185 @@
+# administration/imports.py
+
+import csv
+import io
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+
+from .models import AdminProfile, BulkUserImport, UserRole, UserStatus
+
+User = get_user_model()
+
+IMPORT_BATCH_SIZE = getattr(settings, 'USER_IMPORT_BATCH_SIZE', 1000)
+IMPORT_PROGRESS_EVERY = getattr(settings, 'USER_IMPORT_PROGRESS_EVERY', 1000)
+# Au-delà, seules les premières erreurs sont gardées dans error_log
+IMPORT_MAX_LOGGED_ERRORS = 500
+IMPORT_COLUMNS = ('username', 'email', 'first_name', 'last_name', 'role')
+IMPORT_ROLES = {role for role, _ in UserRole.ROLE_CHOICES}
+DEFAULT_IMPORT_ROLE = 'parent'
+
+
+class UserImport:
+    """Stream a BulkUserImport CSV into User rows, one batch at a time.
+
+    Rows are validated as they are read; each batch is checked against the
+    existing usernames with one query and written with bulk_create, along
+    with the UserRole/UserStatus/AdminProfile rows the post_save signal
+    would have created one user at a time. Imported accounts get an
+    unusable password and choose theirs through the password reset.
+    """
+
+    def __init__(self, bulk_import, batch_size=IMPORT_BATCH_SIZE, progress_every=IMPORT_PROGRESS_EVERY):
+        self.bulk_import = bulk_import
+        self.batch_size = batch_size
+        self.progress_every = progress_every
+        self.success_count = 0
+        self.failure_count = 0
+        self.errors = []
+        self._seen = set()
+        self._reported = 0
+
+    def run(self):
+        """Process the file; returns False if another worker already took the import"""
+        claimed = BulkUserImport.objects.filter(pk=self.bulk_import.pk, status='pending').update(
+            status='processing', success_count=0, failure_count=0, error_log=''
+        )
+        if not claimed:
+            return False
+
+        try:
+            with self.bulk_import.import_file.open('rb') as handle:
+                reader = csv.DictReader(io.TextIOWrapper(handle, encoding='utf-8-sig', newline=''))
+                if 'username' not in (reader.fieldnames or []):
+                    raise ValueError("colonne 'username' absente de l'en-tête")
+                batch = []
+                # Ligne 1 : en-tête
+                for line, row in enumerate(reader, start=2):
+                    user = self.validate_row(line, row)
+                    if user is not None:
+                        batch.append((line, user))
+                    if len(batch) >= self.batch_size:
+                        self.write_batch(batch)
+                        batch = []
+                    self.report_progress()
+                self.write_batch(batch)
+        except (OSError, UnicodeDecodeError, csv.Error, ValueError) as error:
+            self.finish('failed', f"Fichier illisible : {error}")
+        except Exception as error:
+            self.finish('failed', f"Import interrompu : {error}")
+            raise
+        else:
+            self.finish('completed')
+        return True
+
+    def fail(self, line, message):
+        self.failure_count += 1
+        if len(self.errors) < IMPORT_MAX_LOGGED_ERRORS:
+            self.errors.append(f"Ligne {line} : {message}")
+
+    def validate_row(self, line, row):
+        """Unsaved User built from a CSV row, or None if the row is invalid"""
+        values = {column: (row.get(column) or '').strip() for column in IMPORT_COLUMNS}
+        username = values['username']
+        role = values['role'].lower() or DEFAULT_IMPORT_ROLE
+        try:
+            if not username:
+                raise ValidationError("nom d'utilisateur manquant")
+            User.username_validator(username)
+            for column in ('username', 'email', 'first_name', 'last_name'):
+                if len(values[column]) > User._meta.get_field(column).max_length:
+                    raise ValidationError(f"{column} trop long")
+            if values['email']:
+                validate_email(values['email'])
+            if role not in IMPORT_ROLES:
+                raise ValidationError(f"rôle inconnu « {role} »")
+        except ValidationError as error:
+            self.fail(line, '; '.join(error.messages))
+            return None
+        if username in self._seen:
+            self.fail(line, f"« {username} » figure déjà plus haut dans le fichier")
+            return None
+        self._seen.add(username)
+
+        user = User(
+            username=username,
+            email=values['email'],
+            first_name=values['first_name'],
+            last_name=values['last_name'],
+            role=role,
+            is_staff=role == 'admin'
+        )
+        user.set_unusable_password()
+        return user
+
+    def write_batch(self, batch):
+        # Un second échec ne vient pas d'un nom pris entre-temps : le laisser remonter
+        for attempt in range(2):
+            if not batch:
+                return
+            taken = set(User.objects.filter(
+                username__in=[user.username for _, user in batch]
+            ).values_list('username', flat=True))
+            for line, user in batch:
+                if user.username in taken:
+                    self.fail(line, f"« {user.username} » existe déjà")
+            batch = [(line, user) for line, user in batch if user.username not in taken]
+            if not batch:
+                return
+            try:
+                with transaction.atomic():
+                    self._create_users([user for _, user in batch])
+            except IntegrityError:
+                if attempt:
+                    raise
+                # Nom d'utilisateur pris entre-temps : revérifier le lot
+                for _, user in batch:
+                    user.pk = None
+                    user._state.adding = True
+                continue
+            self.success_count += len(batch)
+            return
+
+    def _create_users(self, users):
+        User.objects.bulk_create(users)
+        if any(user.pk is None for user in users):
+            # Bases qui ne renvoient pas les clés insérées
+            ids = dict(User.objects.filter(
+                username__in=[user.username for user in users]
+            ).values_list('username', 'pk'))
+            for user in users:
+                user.pk = ids[user.username]
+
+        # Ce que create_user_related_models fait pour chaque utilisateur, en trois requêtes
+        UserRole.objects.bulk_create([UserRole(user=user, role_type=user.role) for user in users])
+        UserStatus.objects.bulk_create([UserStatus(user=user) for user in users])
+        AdminProfile.objects.bulk_create([AdminProfile(user=user) for user in users if user.is_staff])
+
+    def report_progress(self):
+        processed = self.success_count + self.failure_count
+        if processed - self._reported >= self.progress_every:
+            BulkUserImport.objects.filter(pk=self.bulk_import.pk).update(
+                success_count=self.success_count,
+                failure_count=self.failure_count
+            )
+            self._reported = processed
+
+    def finish(self, status, message=None):
+        errors = self.errors + ([message] if message else [])
+        if self.failure_count > len(self.errors):
+            errors.append(f"… {self.failure_count - len(self.errors)} autre(s) erreur(s) non détaillée(s)")
+        BulkUserImport.objects.filter(pk=self.bulk_import.pk).update(
+            status=status,
+            success_count=self.success_count,
+            failure_count=self.failure_count,
+            error_log='\n'.join(errors)
+        )
+        self.bulk_import.refresh_from_db()
+
+
+def process_user_import(bulk_import, **options):
+    """Run one pending BulkUserImport; see UserImport"""
+    return UserImport(bulk_import, **options).run()
@@ -0,0 +1,98 @@
+# administration/ledger.py
+
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import FinancialRecord, LedgerMonth
+from .reporting import _local_day, _next_month
+
+
+def _month(day):
+    return day.replace(day=1)
+
+
+def ledger_entry(record):
+    """(month, record_type, category, amount) counted in the ledger for ``record``"""
+    # Valeurs pas encore relues depuis la base : datetime de timezone.now, montant saisi en texte
+    return _month(_local_day(record.date)), record.record_type, record.category or '', Decimal(str(record.amount))
+
+
+def shift_ledger(entry, sign):
+    """Add (sign=1) or remove (sign=-1) one FinancialRecord from its monthly balance"""
+    month, record_type, category, amount = entry
+    amount = amount * sign
+    rows = LedgerMonth.objects.filter(month=month, record_type=record_type, category=category)
+    if rows.update(total=F('total') + amount, entries=F('entries') + sign):
+        return
+    try:
+        with transaction.atomic():
+            LedgerMonth.objects.create(
+                month=month, record_type=record_type, category=category, total=amount, entries=sign
+            )
+    except IntegrityError:
+        # Ligne du mois créée entre-temps par une autre transaction
+        rows.update(total=F('total') + amount, entries=F('entries') + sign)
+
+
+def rebuild_ledger():
+    """Recompute every monthly balance from FinancialRecord; returns the number of rows"""
+    rows = FinancialRecord.objects.annotate(month=TruncMonth('date')).values(
+        'month', 'record_type', 'category'
+    ).annotate(total=Sum('amount'), entries=Count('id')).order_by()
+
+    # NULL et '' désignent tous deux une écriture sans catégorie
+    balances = defaultdict(lambda: [Decimal(0), 0])
+    for row in rows:
+        balance = balances[(row['month'], row['record_type'], row['category'] or '')]
+        balance[0] += row['total']
+        balance[1] += row['entries']
+
+    with transaction.atomic():
+        LedgerMonth.objects.all().delete()
+        LedgerMonth.objects.bulk_create([
+            LedgerMonth(month=month, record_type=record_type, category=category, total=total, entries=entries)
+            for (month, record_type, category), (total, entries) in balances.items()
+        ])
+    return len(balances)
+
+
+def ledger_totals(start, end, by_category=False):
+    """FinancialRecord totals between ``start`` and ``end`` (inclusive).
+
+    Whole months are read from LedgerMonth; only the days of the partial
+    first and last months are summed from FinancialRecord, in one query.
+    Keys are record types, or (record_type, category) with ``by_category``.
+    """
+    totals = defaultdict(Decimal)
+    if start > end:
+        return totals
+    first_full = start if start.day == 1 else _next_month(start)
+    after_full = _month(end + timedelta(days=1))
+
+    sources = []
+    if first_full < after_full:
+        sources.append((LedgerMonth.objects.filter(month__gte=first_full, month__lt=after_full), 'total'))
+        partial = []
+        if start < first_full:
+            partial.append(Q(date__gte=start, date__lt=first_full))
+        if after_full <= end:
+            partial.append(Q(date__gte=after_full, date__lte=end))
+    else:
+        # Période contenue dans un seul mois incomplet
+        partial = [Q(date__gte=start, date__lte=end)]
+    if partial:
+        sources.append((FinancialRecord.objects.filter(reduce(or_, partial)), 'amount'))
+
+    fields = ['record_type', 'category'] if by_category else ['record_type']
+    for rows, amount in sources:
+        for row in rows.values(*fields).annotate(sum=Sum(amount)).order_by():
+            key = (row['record_type'], row['category'] or '') if by_category else row['record_type']
+            totals[key] += row['sum'] or 0
+    return totals
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from LMSapp.administration.reporting import rebuild_report_cube, refresh_report_cube
+
+
+class Command(BaseCommand):
+    help = "Met à jour le cube de rapports (jours modifiés et relevé du jour)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help="Recalculer tous les jours depuis l'origine")
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            count = rebuild_report_cube()
+        else:
+            count = refresh_report_cube()
+        self.stdout.write(self.style.SUCCESS(f"{count} jour(s) recalculé(s)"))
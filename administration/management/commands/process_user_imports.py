@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from LMSapp.administration.imports import process_user_import
+from LMSapp.administration.models import BulkUserImport
+
+
+class Command(BaseCommand):
+    help = "Traite les importations d'utilisateurs en attente"
+
+    def add_arguments(self, parser):
+        parser.add_argument('import_ids', nargs='*', type=int, help="Importations à traiter (toutes par défaut)")
+        parser.add_argument('--batch-size', type=int, help="Nombre de lignes écrites par lot")
+
+    def handle(self, *args, **options):
+        imports = BulkUserImport.objects.filter(status='pending').order_by('created_at')
+        if options['import_ids']:
+            imports = imports.filter(pk__in=options['import_ids'])
+        batch = {'batch_size': options['batch_size']} if options['batch_size'] else {}
+
+        for bulk_import in imports:
+            if not process_user_import(bulk_import, **batch):
+                continue
+            message = (
+                f"{bulk_import} : {bulk_import.success_count} utilisateur(s) créé(s), "
+                f"{bulk_import.failure_count} ligne(s) rejetée(s)"
+            )
+            style = self.style.SUCCESS if bulk_import.status == 'completed' else self.style.ERROR
+            self.stdout.write(style(message))
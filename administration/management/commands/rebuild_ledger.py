@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from LMSapp.administration.ledger import rebuild_ledger
+
+
+class Command(BaseCommand):
+    help = "Recalcule les soldes mensuels du grand livre depuis les écritures financières"
+
+    def handle(self, *args, **options):
+        count = rebuild_ledger()
+        self.stdout.write(self.style.SUCCESS(f"{count} solde(s) mensuel(s) recalculé(s)"))
@@ -1,3 +1,5 @@
+import datetime
+
 from django.db import models
 from LMSapp.lms.models import *
 from django.utils import timezone
@@ -10,6 +12,7 @@ from LMSapp.enrollment.models import *
 from LMSapp.accounts.models import *
 from django.contrib.auth import get_user_model
 from django.utils import timezone
+from LMSapp.core.media import protected_storage
 #from django.contrib.auth.models import Activity, ChildProgress
 
 # Create your models here.
@@ -247,7 +250,7 @@ class Resource(models.Model):
     lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, verbose_name="Leçon", related_name='resources')
     title = models.CharField(max_length=200, verbose_name="Titre")
     resource_type = models.CharField(max_length=20, choices=RESOURCE_TYPES, verbose_name="Type de ressource")
-    file = models.FileField(upload_to='resources/', blank=True, null=True, verbose_name="Fichier")
+    file = models.FileField(upload_to='resources/', storage=protected_storage, blank=True, null=True, verbose_name="Fichier")
     external_link = models.URLField(blank=True, null=True, verbose_name="Lien externe")
     description = models.TextField(blank=True, null=True, verbose_name="Description")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
@@ -300,7 +303,8 @@ class Activity(models.Model):
 
 class ContentAnalytics(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='analytics')
-    date = models.DateField(auto_now_add=True)
+    # Pas d'auto_now_add : les compteurs différés d'un jour passé gardent leur date
+    date = models.DateField(default=datetime.date.today)
     views = models.PositiveIntegerField(default=0)
     downloads = models.PositiveIntegerField(default=0)
     completions = models.PositiveIntegerField(default=0)
@@ -350,6 +354,66 @@ class FinancialRecord(models.Model):
     def __str__(self):
         return f"{self.get_record_type_display()} - {self.amount}€ - {self.date}"
 
+class LedgerMonth(models.Model):
+    """Monthly balance of FinancialRecord amounts per record type and category"""
+    month = models.DateField()  # premier jour du mois
+    record_type = models.CharField(max_length=10, choices=FinancialRecord.RECORD_TYPE)
+    # '' : écritures sans catégorie
+    category = models.CharField(max_length=50, blank=True, default='')
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    entries = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Solde mensuel"
+        verbose_name_plural = "Soldes mensuels"
+        unique_together = ['month', 'record_type', 'category']
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} {self.get_record_type_display()} {self.category}: {self.total}"
+
+class ReportCell(models.Model):
+    """One cell of the reporting cube: a metric for a period and an age group/class group slice"""
+    GRANULARITY_CHOICES = [
+        ('day', 'Jour'),
+        ('month', 'Mois'),
+    ]
+    REPORT_TYPE_CHOICES = [
+        ('enrollment', 'Inscriptions'),
+        ('activities', 'Activités'),
+        ('progress', 'Progrès'),
+        ('financial', 'Financier'),
+    ]
+
+    granularity = models.CharField(max_length=5, choices=GRANULARITY_CHOICES)
+    period_start = models.DateField()
+    # '' et 0 : toutes les tranches d'âge / toutes les classes
+    age_group = models.CharField(max_length=20, blank=True, default='')
+    class_group = models.PositiveIntegerField(default=0)
+    report_type = models.CharField(max_length=20, choices=REPORT_TYPE_CHOICES)
+    metric = models.CharField(max_length=50)
+    value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Cellule de rapport"
+        verbose_name_plural = "Cube de rapports"
+        unique_together = ['granularity', 'period_start', 'age_group', 'class_group', 'report_type', 'metric']
+        indexes = [
+            models.Index(
+                fields=['granularity', 'age_group', 'class_group', 'report_type', 'period_start'],
+                name='admin_reportcell_slice_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.period_start} {self.report_type}/{self.metric}: {self.value}"
+
+class ReportDirtyDay(models.Model):
+    """Day whose cube cells must be recomputed after a change in the source tables"""
+    day = models.DateField(primary_key=True)
+
+    def __str__(self):
+        return str(self.day)
+
 class ReportConfiguration(models.Model):
     name = models.CharField(max_length=100)
     period = models.CharField(max_length=50)
@@ -0,0 +1,363 @@
+# administration/reporting.py
+
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from .models import FinancialRecord, LedgerMonth, ReportCell, ReportDirtyDay
+from LMSapp.enrollment.models import Activity as GroupActivity, Child, ChildEnrollment
+from LMSapp.lms.models import ChildProgress
+
+ALL_AGE_GROUPS = ''
+ALL_CLASS_GROUPS = 0
+# Métriques d'état relevées le jour même ; les autres sont des flux que l'on somme
+SNAPSHOT_METRICS = Q(metric='children') | Q(metric__startswith='progress_')
+CUBE_BUILT_KEY = 'administration:report_cube:built'
+CUBE_LOCK_KEY = 'administration:report_cube:lock'
+CUBE_TTL = 10 * 60
+
+
+def _is_snapshot(metric):
+    return metric == 'children' or metric.startswith('progress_')
+
+
+def _local_day(value):
+    if isinstance(value, datetime):
+        return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+    return value
+
+
+def _add(cells, day, report_type, metric, value, age_group=ALL_AGE_GROUPS, class_group=None):
+    """Count ``value`` in its slice and in the 'all' roll-ups of each dimension"""
+    class_group = class_group or ALL_CLASS_GROUPS
+    for age in {age_group or ALL_AGE_GROUPS, ALL_AGE_GROUPS}:
+        for group in {class_group, ALL_CLASS_GROUPS}:
+            cells[(day, age, group, report_type, metric)] += Decimal(value or 0)
+
+
+def _flow_cells(cells, lookup):
+    """Daily flow metrics of the source tables; ``lookup(field)`` restricts the days"""
+    rows = Child.objects.filter(**lookup('created_at__date')).annotate(
+        day=TruncDate('created_at')
+    ).values('day', 'age_group', 'group_id').annotate(total=Count('id'))
+    for row in rows:
+        _add(cells, row['day'], 'enrollment', 'new_children', row['total'], row['age_group'], row['group_id'])
+
+    rows = ChildEnrollment.objects.filter(**lookup('created_at__date')).annotate(
+        day=TruncDate('created_at')
+    ).values('day', 'status').annotate(total=Count('id'))
+    for row in rows:
+        _add(cells, row['day'], 'enrollment', f"enrollments:{row['status']}", row['total'])
+
+    rows = GroupActivity.objects.filter(**lookup('date__date')).annotate(
+        day=TruncDate('date')
+    ).values('day', 'group_id').annotate(total=Count('id'))
+    for row in rows:
+        _add(cells, row['day'], 'activities', 'activities', row['total'], class_group=row['group_id'])
+
+    rows = FinancialRecord.objects.filter(**lookup('date')).values('date', 'record_type').annotate(
+        total=Sum('amount')
+    )
+    for row in rows:
+        metric = 'income' if row['record_type'] == 'income' else 'expenses'
+        _add(cells, row['date'], 'financial', metric, row['total'])
+
+
+def _snapshot_cells(cells, day):
+    """Current headcount and progress scores, recorded as the cells of ``day``"""
+    # Toujours écrite, même à zéro : elle marque les jours relevés
+    cells[(day, ALL_AGE_GROUPS, ALL_CLASS_GROUPS, 'enrollment', 'children')] += 0
+    for row in Child.objects.values('age_group', 'group_id').annotate(total=Count('id')):
+        _add(cells, day, 'enrollment', 'children', row['total'], row['age_group'], row['group_id'])
+
+    rows = ChildProgress.objects.filter(
+        course__isnull=True,
+        category__isnull=False
+    ).values('category', 'child__child_profile__group_id').annotate(
+        total=Sum('score'),
+        entries=Count('id')
+    )
+    for row in rows:
+        group_id = row['child__child_profile__group_id']
+        _add(cells, day, 'progress', f"progress_total:{row['category']}", row['total'], class_group=group_id)
+        _add(cells, day, 'progress', f"progress_entries:{row['category']}", row['entries'], class_group=group_id)
+
+
+def _write_day_cells(cells, days, today):
+    days = set(days)
+    ReportCell.objects.filter(granularity='day', period_start__in=days).exclude(SNAPSHOT_METRICS).delete()
+    if today in days:
+        ReportCell.objects.filter(granularity='day', period_start=today).filter(SNAPSHOT_METRICS).delete()
+    ReportCell.objects.bulk_create([
+        ReportCell(
+            granularity='day',
+            period_start=day,
+            age_group=age_group,
+            class_group=class_group,
+            report_type=report_type,
+            metric=metric,
+            value=value
+        )
+        for (day, age_group, class_group, report_type, metric), value in cells.items()
+        if day in days and (day == today or not _is_snapshot(metric))
+    ])
+
+
+def _next_month(month):
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+def _rebuild_month(month):
+    """Month cells: sum of the daily flows, last daily snapshot of the month"""
+    day_cells = ReportCell.objects.filter(
+        granularity='day',
+        period_start__gte=month,
+        period_start__lt=_next_month(month)
+    )
+    cells = {}
+    for row in day_cells.exclude(SNAPSHOT_METRICS).values(
+        'age_group', 'class_group', 'report_type', 'metric'
+    ).annotate(total=Sum('value')):
+        cells[(row['age_group'], row['class_group'], row['report_type'], row['metric'])] = row['total']
+
+    last_snapshot = day_cells.filter(metric='children').aggregate(day=Max('period_start'))['day']
+    if last_snapshot:
+        for cell in day_cells.filter(SNAPSHOT_METRICS, period_start=last_snapshot):
+            cells[(cell.age_group, cell.class_group, cell.report_type, cell.metric)] = cell.value
+
+    ReportCell.objects.filter(granularity='month', period_start=month).delete()
+    ReportCell.objects.bulk_create([
+        ReportCell(
+            granularity='month',
+            period_start=month,
+            age_group=age_group,
+            class_group=class_group,
+            report_type=report_type,
+            metric=metric,
+            value=value
+        )
+        for (age_group, class_group, report_type, metric), value in cells.items()
+    ])
+
+
+def refresh_report_cube():
+    """Recompute the cells of the days marked dirty, today's snapshot and their months"""
+    today = timezone.localdate()
+    with transaction.atomic():
+        dirty = list(ReportDirtyDay.objects.select_for_update().values_list('day', flat=True))
+        days = set(dirty) | {today}
+
+        cells = defaultdict(Decimal)
+        _flow_cells(cells, lambda field: {f'{field}__in': days})
+        _snapshot_cells(cells, today)
+        _write_day_cells(cells, days, today)
+        for month in {day.replace(day=1) for day in days}:
+            _rebuild_month(month)
+
+        ReportDirtyDay.objects.filter(day__in=dirty).delete()
+    cache.set(CUBE_BUILT_KEY, time.time(), None)
+    return len(days)
+
+
+def rebuild_report_cube():
+    """Recompute every flow cell from the source tables (past snapshots are kept)"""
+    today = timezone.localdate()
+    firsts = [
+        _local_day(value) for value in (
+            Child.objects.aggregate(first=Min('created_at'))['first'],
+            ChildEnrollment.objects.aggregate(first=Min('created_at'))['first'],
+            GroupActivity.objects.aggregate(first=Min('date'))['first'],
+            FinancialRecord.objects.aggregate(first=Min('date'))['first'],
+        ) if value
+    ]
+    start = min(firsts + [today])
+    days = [start + timedelta(days=offset) for offset in range((today - start).days + 1)]
+
+    with transaction.atomic():
+        ReportCell.objects.filter(granularity='day').exclude(SNAPSHOT_METRICS).delete()
+        cells = defaultdict(Decimal)
+        _flow_cells(cells, lambda field: {f'{field}__range': (start, today)})
+        _snapshot_cells(cells, today)
+        _write_day_cells(cells, days, today)
+        month = start.replace(day=1)
+        while month <= today:
+            _rebuild_month(month)
+            month = _next_month(month)
+        ReportDirtyDay.objects.all().delete()
+    cache.set(CUBE_BUILT_KEY, time.time(), None)
+    return len(days)
+
+
+def ensure_report_cube_fresh():
+    """Refresh the cube when days are dirty or today's snapshot is older than CUBE_TTL"""
+    built = cache.get(CUBE_BUILT_KEY)
+    if built and time.time() - built < CUBE_TTL and not ReportDirtyDay.objects.exists():
+        return
+    # Une seule requête recalcule ; les autres lisent les cellules en place
+    if not cache.add(CUBE_LOCK_KEY, True, 60):
+        return
+    try:
+        refresh_report_cube()
+    finally:
+        cache.delete(CUBE_LOCK_KEY)
+
+
+def mark_report_days_dirty(*values):
+    """Queue the days touched by a change in a source table for the next refresh"""
+    days = {_local_day(value) for value in values if value}
+    if days:
+        transaction.on_commit(lambda: _mark_days(days))
+
+
+def _mark_days(days):
+    ReportDirtyDay.objects.bulk_create([ReportDirtyDay(day=day) for day in days], ignore_conflicts=True)
+    invalidate_monthly_series(days)
+
+
+# Lecture du cube
+
+def cube_slice(age_group='all', class_group='all'):
+    """(age_group, class_group) cube keys of the report filters"""
+    age = ALL_AGE_GROUPS if age_group in ('all', None) else age_group
+    try:
+        group = ALL_CLASS_GROUPS if class_group in ('all', None) else int(class_group)
+    except (TypeError, ValueError):
+        group = ALL_CLASS_GROUPS
+    return age, group
+
+
+def _metric_slice(metric, age, group):
+    """Cube keys a metric is actually broken down by; other dimensions read the 'all' cell"""
+    if metric in ('children', 'new_children'):
+        return age, group
+    if metric == 'activities' or metric.startswith('progress_'):
+        # Ni les activités de groupe ni les progrès ne portent de tranche d'âge
+        return ALL_AGE_GROUPS, group
+    return ALL_AGE_GROUPS, ALL_CLASS_GROUPS
+
+
+def _slice_filter(age, group):
+    return (
+        Q(age_group=age, class_group=group) |
+        Q(age_group=ALL_AGE_GROUPS, class_group=group) |
+        Q(age_group=ALL_AGE_GROUPS, class_group=ALL_CLASS_GROUPS)
+    )
+
+
+def get_flow_totals(cube_key, start, end, granularity='day'):
+    """Sum of every flow metric of a slice between two dates, keyed by metric"""
+    age, group = cube_key
+    rows = ReportCell.objects.filter(
+        _slice_filter(age, group),
+        granularity=granularity,
+        period_start__range=(start, end)
+    ).exclude(SNAPSHOT_METRICS).values('age_group', 'class_group', 'metric').annotate(total=Sum('value'))
+    return {
+        row['metric']: row['total']
+        for row in rows
+        if (row['age_group'], row['class_group']) == _metric_slice(row['metric'], age, group)
+    }
+
+
+def get_snapshot(cube_key, on_day):
+    """Snapshot metrics of a slice from the last day recorded on or before ``on_day``"""
+    age, group = cube_key
+    day = ReportCell.objects.filter(
+        granularity='day',
+        metric='children',
+        age_group=ALL_AGE_GROUPS,
+        class_group=ALL_CLASS_GROUPS,
+        period_start__lte=on_day
+    ).aggregate(day=Max('period_start'))['day']
+    if day is None:
+        return {}
+    cells = ReportCell.objects.filter(SNAPSHOT_METRICS, granularity='day', period_start=day, class_group=group)
+    snapshot = {'age_groups': {}}
+    for cell in cells:
+        if cell.metric == 'children' and cell.age_group != ALL_AGE_GROUPS:
+            snapshot['age_groups'][cell.age_group] = int(cell.value)
+        if cell.age_group == _metric_slice(cell.metric, age, group)[0]:
+            snapshot[cell.metric] = cell.value
+    return snapshot
+
+
+def progress_averages(snapshot):
+    """Average ChildProgress score per skill category of a snapshot"""
+    averages = {}
+    for metric, total in snapshot.items():
+        if metric.startswith('progress_total:'):
+            category = metric.split(':', 1)[1]
+            entries = snapshot.get(f'progress_entries:{category}') or 0
+            averages[category] = round(total / entries) if entries else 0
+    return averages
+
+
+# Séries mensuelles des graphiques (ReportsDataView)
+
+MONTH_LABELS = ['Jan', 'Fév', 'Mar', 'Avr', 'Mai', 'Juin', 'Juil', 'Août', 'Sep', 'Oct', 'Nov', 'Déc']
+MONTHLY_SERIES = {
+    # série : (lignes, champ daté, lookup de jour, agrégat)
+    'enrollments': (ChildEnrollment.objects.all(), 'created_at', 'created_at__date', Count('id')),
+    # Montants lus dans les soldes mensuels du grand livre
+    'income': (LedgerMonth.objects.filter(record_type='income'), 'month', 'month', Sum('total')),
+    'expenses': (LedgerMonth.objects.filter(record_type='expense'), 'month', 'month', Sum('total')),
+}
+
+
+def _series_key(name, month):
+    return f'administration:series:{name}:{month:%Y-%m}'
+
+
+def month_range(first, count):
+    """``count`` consecutive first-of-month dates starting at ``first``"""
+    months = [first.replace(day=1)]
+    while len(months) < count:
+        months.append(_next_month(months[-1]))
+    return months
+
+
+def get_monthly_series(name, months):
+    """Monthly totals of a series; closed months come from the cache.
+
+    Closed months are cached with no expiry and invalidated by the source
+    signals. Only the current month and closed months missing from the
+    cache are counted, in one TruncMonth query.
+    """
+    queryset, field, day_lookup, aggregate = MONTHLY_SERIES[name]
+    current = timezone.localdate().replace(day=1)
+    closed_keys = {month: _series_key(name, month) for month in months if month < current}
+    cached = cache.get_many(closed_keys.values())
+
+    values = {month: cached[key] for month, key in closed_keys.items() if key in cached}
+    missing = [month for month in months if month not in values and month <= current]
+    if missing:
+        rows = queryset.filter(**{
+            f'{day_lookup}__gte': min(missing),
+            f'{day_lookup}__lt': _next_month(max(missing)),
+        }).annotate(period=TruncMonth(field)).values('period').annotate(total=aggregate)
+        # Montants Decimal convertis pour la sérialisation JSON des graphiques
+        counted = {
+            _local_day(row['period']): float(row['total']) if isinstance(row['total'], Decimal) else row['total']
+            for row in rows
+        }
+        for month in missing:
+            values[month] = counted.get(month, 0)
+        cache.set_many({closed_keys[month]: values[month] for month in missing if month in closed_keys}, None)
+
+    # Mois futurs : pas encore de données
+    return [values.get(month) for month in months]
+
+
+def invalidate_monthly_series(days):
+    cache.delete_many([
+        _series_key(name, month)
+        for name in MONTHLY_SERIES
+        for month in {day.replace(day=1) for day in days}
+    ])
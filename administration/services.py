@@ -0,0 +1,89 @@
+# administration/services.py
+
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Activity, ContentCategory, Course, Lesson, Resource
+
+# Totaux affichés en tête de content_management
+CONTENT_STATS_MODELS = {
+    'courses_count': Course,
+    'lessons_count': Lesson,
+    'resources_count': Resource,
+    'activities_count': Activity,
+}
+CONTENT_STATS_KEY = 'administration:content_stats'
+CONTENT_STATS_LOCK_KEY = 'administration:content_stats:lock'
+CONTENT_STATS_TTL = 5 * 60
+CONTENT_STATS_LOCK_TIMEOUT = 30
+
+
+def _compute_content_stats():
+    counts = {name: model.objects.count() for name, model in CONTENT_STATS_MODELS.items()}
+    cache.set(CONTENT_STATS_KEY, {'counts': counts, 'expires': time.time() + CONTENT_STATS_TTL}, None)
+    return counts
+
+
+def get_content_stats():
+    """Course/lesson/resource/activity totals, served from the cache.
+
+    Signals keep the cached totals up to date. They are also recounted
+    every CONTENT_STATS_TTL seconds to correct any drift. Only the request
+    that takes the lock recounts; the others keep serving the previous
+    totals meanwhile.
+    """
+    stats = cache.get(CONTENT_STATS_KEY)
+    if stats is not None and stats['expires'] > time.time():
+        return stats['counts']
+    if not cache.add(CONTENT_STATS_LOCK_KEY, True, CONTENT_STATS_LOCK_TIMEOUT):
+        if stats is not None:
+            return stats['counts']
+        # Premier calcul déjà en cours ailleurs : compter sans écrire le cache
+        return {name: model.objects.count() for name, model in CONTENT_STATS_MODELS.items()}
+    try:
+        return _compute_content_stats()
+    finally:
+        cache.delete(CONTENT_STATS_LOCK_KEY)
+
+
+def _shift_content_stat(name, delta):
+    stats = cache.get(CONTENT_STATS_KEY)
+    if stats is None:
+        return
+    stats['counts'][name] = max(stats['counts'][name] + delta, 0)
+    cache.set(CONTENT_STATS_KEY, stats, None)
+
+
+def shift_content_stat(name, delta):
+    """Adjust one cached total once the current transaction commits"""
+    transaction.on_commit(lambda: _shift_content_stat(name, delta))
+
+
+def _category_count(queryset, category_field):
+    """Correlated COUNT of ``queryset`` rows belonging to the outer ContentCategory"""
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{category_field: OuterRef('pk')}).order_by().values(category_field).annotate(
+                total=Count('pk')
+            ).values('total')
+        ),
+        0
+    )
+
+
+def get_category_content_counts():
+    """ContentCategory annotated with course/lesson/resource/activity counts.
+
+    Each count is its own subquery, so resources and activities of a lesson
+    are never joined together and the totals are not multiplied.
+    """
+    return ContentCategory.objects.annotate(
+        course_count=_category_count(Course.objects.all(), 'category'),
+        lesson_count=_category_count(Lesson.objects.all(), 'course__category'),
+        resource_count=_category_count(Resource.objects.all(), 'lesson__course__category'),
+        activity_count=_category_count(Activity.objects.all(), 'lesson__course__category'),
+    )
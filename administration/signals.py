@@ -1,22 +1,100 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
 from django.dispatch import receiver
-from .models import Course, ContentAnalytics
-from django.utils import timezone
+from django.db import transaction
+from .analytics import analytics_buffer
+from .ledger import ledger_entry, shift_ledger
+from .models import Course, FinancialRecord
+from .reporting import mark_report_days_dirty
+from .services import CONTENT_STATS_MODELS, shift_content_stat
+from LMSapp.enrollment.models import Activity as GroupActivity, Child, ChildEnrollment
 
 @receiver(post_save, sender=Course)
-def create_initial_analytics(sender, instance, created, **kwargs):
+def ensure_daily_analytics(sender, instance, **kwargs):
+    # Ligne analytics du jour créée en différé : les sauvegardes d'un même cours
+    # dans l'intervalle de vidage du tampon se réduisent à une seule écriture
+    course_id = instance.pk
+    transaction.on_commit(lambda: analytics_buffer.add(course_id))
+
+
+# Totaux de contenu mis en cache (voir services.get_content_stats)
+
+def count_content_on_create(sender, instance, created, **kwargs):
     if created:
-        # Créer une entrée analytics pour le nouveau cours
-        ContentAnalytics.objects.create(course=instance, date=timezone.now().date())
+        shift_content_stat(CONTENT_STATS_NAMES[sender], 1)
 
-@receiver(post_save, sender=Course)
-def update_course_analytics(sender, instance, **kwargs):
-    # Mettre à jour les analytics quotidiennes
-    today = timezone.now().date()
-    analytics, created = ContentAnalytics.objects.get_or_create(
-        course=instance, 
-        date=today,
-        defaults={'views': 0, 'downloads': 0, 'completions': 0}
-    )
-    if not created:
-        analytics.save()
\ No newline at end of file
+
+def count_content_on_delete(sender, instance, **kwargs):
+    shift_content_stat(CONTENT_STATS_NAMES[sender], -1)
+
+
+CONTENT_STATS_NAMES = {model: name for name, model in CONTENT_STATS_MODELS.items()}
+
+for content_model in CONTENT_STATS_NAMES:
+    post_save.connect(count_content_on_create, sender=content_model)
+    post_delete.connect(count_content_on_delete, sender=content_model)
+
+
+# Jours du cube de rapports à recalculer (voir reporting.refresh_report_cube)
+
+REPORT_SOURCES = {
+    Child: 'created_at',
+    ChildEnrollment: 'created_at',
+    GroupActivity: 'date',
+    FinancialRecord: 'date',
+}
+
+
+def remember_report_day(sender, instance, **kwargs):
+    instance._report_day = instance.__dict__.get(REPORT_SOURCES[sender])
+
+
+def mark_report_day_on_save(sender, instance, **kwargs):
+    new_day = getattr(instance, REPORT_SOURCES[sender])
+    mark_report_days_dirty(instance._report_day, new_day)
+    instance._report_day = new_day
+
+
+def mark_report_day_on_delete(sender, instance, **kwargs):
+    mark_report_days_dirty(instance._report_day)
+
+
+for report_model in REPORT_SOURCES:
+    post_init.connect(remember_report_day, sender=report_model)
+    post_save.connect(mark_report_day_on_save, sender=report_model)
+    post_delete.connect(mark_report_day_on_delete, sender=report_model)
+
+
+# Soldes mensuels du grand livre (voir ledger.ledger_totals)
+
+LEDGER_FIELDS = ('date', 'record_type', 'category', 'amount')
+
+
+@receiver(post_init, sender=FinancialRecord)
+def remember_ledger_entry(sender, instance, **kwargs):
+    loaded = all(field in instance.__dict__ for field in LEDGER_FIELDS)
+    instance._ledger_entry = ledger_entry(instance) if loaded and instance.pk else None
+
+
+@receiver(pre_save, sender=FinancialRecord)
+@receiver(pre_delete, sender=FinancialRecord)
+def load_ledger_entry(sender, instance, **kwargs):
+    # Instance chargée avec des champs différés : relire l'écriture enregistrée
+    if instance._ledger_entry is None and instance.pk:
+        stored = sender.objects.filter(pk=instance.pk).only(*LEDGER_FIELDS).first()
+        instance._ledger_entry = stored._ledger_entry if stored else None
+
+
+@receiver(post_save, sender=FinancialRecord)
+def update_ledger_on_save(sender, instance, **kwargs):
+    entry = ledger_entry(instance)
+    if entry != instance._ledger_entry:
+        if instance._ledger_entry is not None:
+            shift_ledger(instance._ledger_entry, -1)
+        shift_ledger(entry, 1)
+    instance._ledger_entry = entry
+
+
+@receiver(post_delete, sender=FinancialRecord)
+def update_ledger_on_delete(sender, instance, **kwargs):
+    if instance._ledger_entry is not None:
+        shift_ledger(instance._ledger_entry, -1)
@@ -1,3 +1,48 @@
-from django.test import TestCase
+from datetime import date
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, TestCase
+
+from LMSapp.enrollment.models import ChildEnrollment
+
+from .views import age_group_birth_dates, enrollment_admin
+
+
+class EnrollmentAdminAgeGroupTests(TestCase):
+    def setUp(self):
+        self.parent = get_user_model().objects.create(username='parent')
+        today = date.today()
+        self.toddler = self.enroll('Lina', date(today.year - 2, 1, 1))
+        self.preschooler = self.enroll('Adam', date(today.year - 4, 1, 1))
+
+    def enroll(self, first_name, birth_date):
+        return ChildEnrollment.objects.create(
+            parent=self.parent,
+            child_first_name=first_name,
+            child_last_name='Test',
+            birth_date=birth_date,
+            gender='F',
+            grade_level='PS',
+            schedule_type='FT',
+            start_date=date.today(),
+            emergency_contact_name='Contact',
+            emergency_contact_phone='0600000000',
+            emergency_contact_relation='Parent'
+        )
+
+    def test_birth_date_bounds(self):
+        today = date(2024, 2, 29)
+        self.assertEqual(
+            age_group_birth_dates('preschool', today),
+            {'birth_date__lte': date(2021, 2, 28), 'birth_date__gt': date(2018, 2, 28)}
+        )
+        self.assertEqual(age_group_birth_dates('school_age', today), {'birth_date__lte': date(2018, 2, 28)})
+
+    def test_export_filtered_by_age_group(self):
+        request = RequestFactory().get('/admin/enrollment/', {'age_group': 'toddlers', 'export': '1'})
+        response = enrollment_admin(request)
+
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content).decode()
+        self.assertIn('Lina Test', content)
+        self.assertNotIn('Adam Test', content)
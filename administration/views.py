@@ -1,55 +1,76 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.contrib.auth.models import User
-from LMSapp.accounts.views import CustomUserCreationForm
+from django.contrib.auth import get_user_model
 from django.core.paginator import Paginator
 from django.contrib.auth.decorators import login_required, user_passes_test
 from .models import (
     ContentCategory, Course, Lesson, 
-    Resource, Activity, ContentAnalytics, EnrollmentStatusLog
+    Resource, Activity, ContentAnalytics, EnrollmentStatusLog, UserRole
 )
+from .analytics import record_content_hit
+from .ledger import ledger_totals
+from .reporting import (
+    ALL_AGE_GROUPS, ALL_CLASS_GROUPS, MONTH_LABELS, cube_slice, ensure_report_cube_fresh, get_flow_totals, get_monthly_series, get_snapshot,
+    month_range, progress_averages
+)
+from .services import get_category_content_counts, get_content_stats
 from .forms import CourseForm, LessonForm, ResourceForm, ActivityForm, EnrollmentFilterForm
 import csv
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from LMSapp.enrollment.models import ChildEnrollment
 import json
-from datetime import datetime, timedelta
-from django.db.models import Count, Q, Sum, Avg
+from datetime import date, datetime, timedelta
+from django.db.models import Case, CharField, Count, F, IntegerField, OuterRef, Q, Subquery, Sum, Avg, Value, When
+from django.db.models.functions import Coalesce, NullIf
 from django.http import JsonResponse
 from django.utils import timezone
+from django.utils.text import Truncator
 from django.views import View
-from LMSapp.enrollment.models import Child
-from LMSapp.lms.models import ActivityRecord, ChildProgress
+from LMSapp.enrollment.models import Activity as GroupActivity, Child
+from LMSapp.lms.models import ChildProgress
 from LMSapp.communication.models import Notification
 from .models import FinancialRecord, ReportConfiguration
+from LMSapp.core.media import serve_protected_file
+
+User = get_user_model()
 
 def admin_home(request):
     return render(request, "administration/enrollment_admin.html")
 
+def annotate_user_roles(users):
+    """Annotate ``resolved_role``: User.role, else latest UserRole, else admin/unknown"""
+    # User.role passe en premier : chaque compte reçoit un UserRole 'parent' par défaut à sa création
+    latest_role = UserRole.objects.filter(user=OuterRef('pk')).order_by('-updated_at', '-pk').values('role_type')[:1]
+    return users.annotate(
+        resolved_role=Coalesce(
+            NullIf('role', Value('')),
+            Subquery(latest_role),
+            Case(
+                When(is_superuser=True, then=Value('admin')),
+                default=Value('unknown'),
+            ),
+            output_field=CharField()
+        )
+    )
+
+
 def user_management(request):
-    # Récupérer tous les utilisateurs
-    users = User.objects.all().order_by('last_name', 'first_name')
-    
-    # Ajouter une propriété 'role' à chaque utilisateur
-    for user in users:
-        if hasattr(user, 'parentprofile'):
-            user.role = 'parent'
-        elif hasattr(user, 'teacherprofile'):
-            user.role = 'teacher'
-        elif hasattr(user, 'child'):
-            user.role = 'child'
-        elif user.is_superuser:
-            user.role = 'admin'
-        else:
-            user.role = 'unknown'
+    # Rôle calculé en SQL : seule la page courante est chargée
+    users = annotate_user_roles(User.objects.all()).order_by('last_name', 'first_name', 'pk')
     
-    # Statistiques
-    total_users = users.count()
-    parent_count = CustomUserCreationForm.objects.count()
-    teacher_count = CustomUserCreationForm.objects.count()
-    child_count = CustomUserCreationForm.objects.count()
+    # Statistiques en une seule requête groupée
+    role_counts = {
+        row['resolved_role']: row['total']
+        for row in users.order_by().values('resolved_role').annotate(total=Count('pk'))
+    }
+    total_users = sum(role_counts.values())
+    parent_count = role_counts.get('parent', 0)
+    teacher_count = role_counts.get('teacher', 0)
+    child_count = role_counts.get('child', 0)
     
     # Pagination
     paginator = Paginator(users, 25)  # 25 utilisateurs par page
+    # Le total est déjà connu : pas de COUNT supplémentaire
+    paginator.count = total_users
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
@@ -58,7 +79,7 @@ def user_management(request):
     end_index = page_obj.end_index()
     
     # Liste des parents pour le formulaire enfant
-    parents = User.objects.filter(parentprofile__isnull=False)
+    parents = users.filter(resolved_role='parent')
     
     context = {
         'users': page_obj,
@@ -81,11 +102,8 @@ def is_content_manager(user):
 @login_required
 @user_passes_test(is_content_manager)
 def content_management(request):
-    # Récupérer les statistiques
-    courses_count = Course.objects.count()
-    lessons_count = Lesson.objects.count()
-    resources_count = Resource.objects.count()
-    activities_count = Activity.objects.count()
+    # Récupérer les statistiques (cache tenu à jour par les signaux)
+    stats = get_content_stats()
     
     # Récupérer les catégories pour les filtres
     categories = ContentCategory.objects.all()
@@ -106,14 +124,14 @@ def content_management(request):
     
     # Pagination
     paginator = Paginator(courses_list, 10)
+    if category_filter == 'all' and status_filter == 'all':
+        # Liste non filtrée : le total est déjà connu
+        paginator.count = stats['courses_count']
     page_number = request.GET.get('page')
     courses = paginator.get_page(page_number)
     
     context = {
-        'courses_count': courses_count,
-        'lessons_count': lessons_count,
-        'resources_count': resources_count,
-        'activities_count': activities_count,
+        **stats,
         'categories': categories,
         'courses': courses,
         'selected_category': category_filter,
@@ -202,6 +220,7 @@ def change_course_status(request, slug):
 @user_passes_test(is_content_manager)
 def lesson_detail(request, course_slug, lesson_slug):
     lesson = get_object_or_404(Lesson, slug=lesson_slug, course__slug=course_slug)
+    record_content_hit(lesson.course_id, views=1)
     resources = lesson.resources.all()
     activities = lesson.activities.all()
     
@@ -212,6 +231,20 @@ def lesson_detail(request, course_slug, lesson_slug):
     }
     return render(request, 'administration/lesson_detail.html', context)
 
+@login_required
+@user_passes_test(is_content_manager)
+def resource_file(request, resource_id):
+    resource = get_object_or_404(Resource.objects.select_related('lesson'), id=resource_id)
+    if not resource.file:
+        raise Http404("Aucun fichier pour cette ressource")
+    
+    # Une requête de plage (reprise, lecture vidéo) n'est pas un nouveau téléchargement
+    if 'Range' not in request.headers:
+        record_content_hit(resource.lesson.course_id, downloads=1)
+    
+    # Permissions vérifiées ici, octets servis par plages ou délégués au serveur web
+    return serve_protected_file(request, resource.file)
+
 # Vues similaires pour les leçons, ressources et activités
 # (create_lesson, edit_lesson, delete_lesson, etc.)
 
@@ -219,16 +252,11 @@ def lesson_detail(request, course_slug, lesson_slug):
 @user_passes_test(is_content_manager)
 def content_analytics(request):
     # Récupérer les statistiques globales
-    categories = ContentCategory.objects.annotate(
-        course_count=Count('courses'),
-        lesson_count=Count('courses__lessons'),
-        resource_count=Count('courses__lessons__resources'),
-        activity_count=Count('courses__lessons__activities'),
-    )
+    categories = get_category_content_counts()
     
     # Top cours par vues
     top_courses = Course.objects.annotate(
-        total_views=Sum('analytics__views')
+        total_views=Coalesce(Sum('analytics__views'), 0)
     ).order_by('-total_views')[:5]
     
     # Évolution des vues
@@ -245,10 +273,71 @@ def content_analytics(request):
     }
     return render(request, 'administration/content_analytics.html', context)
 
+class Echo:
+    """Pseudo-buffer for csv.writer: returns each line instead of storing it"""
+    
+    def write(self, value):
+        return value
+
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+def stream_enrollments_csv(enrollments):
+    """Yield the CSV export line by line, reading rows through a chunked cursor"""
+    writer = csv.writer(Echo())
+    yield writer.writerow([
+        'ID', 'Child', 'Parent', 'Enrollment Date',
+        'Grade Level', 'Status', 'Medical Notes'
+    ])
+    
+    # Seules les colonnes exportées sont lues, par lots côté serveur
+    rows = enrollments.only(
+        'id', 'child_first_name', 'child_last_name', 'created_at', 'grade_level', 'status',
+        'medical_conditions', 'parent__first_name', 'parent__last_name', 'parent__username'
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    for e in rows:
+        yield writer.writerow([
+            e.id,
+            f"{e.child_first_name} {e.child_last_name}",
+            e.parent.get_full_name() or e.parent.username,
+            e.created_at.strftime('%Y-%m-%d'),
+            e.grade_level,
+            e.get_status_display(),
+            Truncator(e.medical_conditions or '').chars(100)
+        ])
+
+
+# Âges (en années révolues) de chaque tranche de Child.AGE_GROUP_CHOICES : [min, max[
+ENROLLMENT_AGE_GROUPS = {
+    'toddlers': (0, 3),
+    'preschool': (3, 6),
+    'school_age': (6, None),
+}
+
+
+def age_group_birth_dates(age_group, today=None):
+    """birth_date lookups of the children of an age group (ChildEnrollment has no Child link)"""
+    today = today or date.today()
+    youngest, oldest = ENROLLMENT_AGE_GROUPS[age_group]
+
+    def years_ago(years):
+        try:
+            return today.replace(year=today.year - years)
+        except ValueError:
+            # 29 février
+            return today.replace(year=today.year - years, day=28)
+
+    lookups = {'birth_date__lte': years_ago(youngest)}
+    if oldest is not None:
+        lookups['birth_date__gt'] = years_ago(oldest)
+    return lookups
+
+
 def enrollment_admin(request):
     # Apply filters
     form = EnrollmentFilterForm(request.GET or None)
-    enrollments = ChildEnrollment.objects.select_related('child', 'parent').order_by('-created_at')
+    enrollments = ChildEnrollment.objects.select_related('parent').order_by('-created_at', '-pk')
     
     if form.is_valid():
         status = form.cleaned_data.get('status')
@@ -264,36 +353,19 @@ def enrollment_admin(request):
         if end_date:
             enrollments = enrollments.filter(created_at__lte=end_date)
         if age_group:
-            enrollments = enrollments.filter(child__age_group=age_group)
+            enrollments = enrollments.filter(**age_group_birth_dates(age_group))
         if search:
             enrollments = enrollments.filter(
-                Q(child__first_name__icontains=search) |
-                Q(child__last_name__icontains=search) |
-                Q(parent__user__first_name__icontains=search) |
-                Q(parent__user__last_name__icontains=search)
+                Q(child_first_name__icontains=search) |
+                Q(child_last_name__icontains=search) |
+                Q(parent__first_name__icontains=search) |
+                Q(parent__last_name__icontains=search)
             )
     
     # Export to CSV
     if 'export' in request.GET:
-        response = HttpResponse(content_type='text/csv')
+        response = StreamingHttpResponse(stream_enrollments_csv(enrollments), content_type='text/csv')
         response['Content-Disposition'] = 'attachment; filename="enrollments.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow([
-            'ID', 'Child', 'Parent', 'Enrollment Date', 
-            'Age Group', 'Status', 'Medical Notes'
-        ])
-        
-        for e in enrollments:
-            writer.writerow([
-                e.id,
-                f"{e.child.first_name} {e.child.last_name}",
-                f"{e.parent.user.get_full_name()}",
-                e.created_at.strftime('%Y-%m-%d'),
-                e.child.age_group,
-                e.get_status_display(),
-                e.medical_notes[:100] + '...' if e.medical_notes else ''
-            ])
         return response
     
     # Pagination
@@ -325,6 +397,9 @@ def update_enrollment_status(request, enrollment_id, new_status):
     
     return HttpResponse(status=204)  # No content response for AJAX
 
+# Fenêtre glissante de la tendance des activités populaires
+PARTICIPATION_TREND_DAYS = 30
+
 class ReportsView(View):
     template_name = 'administration/reports.html'
     
@@ -366,51 +441,74 @@ class ReportsView(View):
         # Calculer les dates en fonction de la période
         start_date, end_date = self.get_date_range(filters['period'])
         
+        # Lectures indexées dans le cube de rapports (recalculé seulement si nécessaire)
+        ensure_report_cube_fresh()
+        cube_key = cube_slice(filters['age_group'], filters['class_group'])
+        
+        # Flux de la période ; la période précédente de même durée sert aux tendances
+        flows = get_flow_totals(cube_key, start_date, end_date)
+        previous_end = start_date - timedelta(days=1)
+        previous_start = previous_end - (end_date - start_date)
+        
+        # Effectifs relevés en fin et au début de la période
+        snapshot = get_snapshot(cube_key, end_date)
+        start_snapshot = get_snapshot(cube_key, previous_end)
+        
         # Statistiques de base
-        total_children = Child.objects.count()
+        total_children = int(snapshot.get('children', 0))
         capacity = 90  # Capacité maximale théorique
         occupancy_rate = round((total_children / capacity) * 100) if capacity > 0 else 0
         
         # Activités
-        activities_count = Activity.objects.filter(
-            date__range=(start_date, end_date))
-        if filters['age_group'] != 'all':
-            activities_count = activities_count.filter(age_group=filters['age_group'])
-        activities_count = activities_count.count()
+        activities_count = int(flows.get('activities', 0))
         
-        # Taux de rétention (simplifié)
-        retention_rate = 89  # À remplacer par un calcul réel
+        # Taux de rétention : enfants du début de période encore présents à la fin
+        retention_rate = self.get_retention_rate(start_snapshot, total_children, flows)
         
         # Répartition par âge
-        age_distribution = Child.objects.values('age_group').annotate(
-            total=Count('id')).order_by('age_group')
+        age_distribution = [
+            {'age_group': age_group, 'total': total}
+            for age_group, total in sorted(snapshot.get('age_groups', {}).items())
+        ]
         
-        # Statut des inscriptions
-        enrollment_status = ChildEnrollment.objects.values('status').annotate(
-            total=Count('id'))
+        # Statut des inscriptions (depuis l'origine, cellules mensuelles)
+        enrollment_totals = get_flow_totals(cube_slice(), date.min, end_date, granularity='month')
+        enrollment_status = [
+            {'status': metric.split(':', 1)[1], 'total': int(total)}
+            for metric, total in sorted(enrollment_totals.items())
+            if metric.startswith('enrollments:')
+        ]
         
         # Progrès des enfants
-        progress_data = self.get_child_progress(filters)
+        progress_data = self.get_child_progress(snapshot, start_snapshot)
         
         # Activités populaires
-        popular_activities = self.get_popular_activities(filters)
+        popular_activities = self.get_popular_activities(cube_key, start_date, end_date)
         
         # Données financières
-        financial_data = self.get_financial_data(start_date, end_date)
+        financial_data = self.get_financial_data(start_date, end_date, previous_start, previous_end)
         
         return {
             'total_children': total_children,
             'occupancy_rate': occupancy_rate,
             'activities_count': activities_count,
             'retention_rate': retention_rate,
-            'age_distribution': list(age_distribution),
-            'enrollment_status': list(enrollment_status),
+            'age_distribution': age_distribution,
+            'enrollment_status': enrollment_status,
             'child_progress': progress_data,
             'popular_activities': popular_activities,
             'financial_data': financial_data,
             'period_labels': self.get_period_labels(filters['period'])
         }
     
+    def get_retention_rate(self, start_snapshot, total_children, flows):
+        children_at_start = int(start_snapshot.get('children', 0))
+        if not children_at_start:
+            # Pas de relevé avant le début de la période
+            return None
+        retained = total_children - int(flows.get('new_children', 0))
+        return min(max(round(retained / children_at_start * 100), 0), 100)
+    
     def get_date_range(self, period):
         today = timezone.now().date()
         if period == 'last_month':
@@ -437,65 +535,119 @@ class ReportsView(View):
         else:  # current_year
             return ['Jan', 'Fév', 'Mar', 'Avr', 'Mai', 'Juin', 'Juil', 'Août', 'Sep', 'Oct', 'Nov', 'Déc']
     
-    def get_child_progress(self, filters):
-        progress_categories = [
-            'social_development',
-            'cognitive_skills',
-            'creative_expression',
-            'fine_motor',
-            'gross_motor'
-        ]
+    def get_child_progress(self, snapshot, start_snapshot):
+        averages = progress_averages(snapshot)
+        start_averages = progress_averages(start_snapshot)
         
         progress_data = {}
-        for category in progress_categories:
-            avg_progress = ChildProgress.objects.filter(
-                progress_type=category
-            ).aggregate(avg=Avg('progress_value'))['avg'] or 0
-            
+        for category, _ in ChildProgress.SKILL_CATEGORIES:
+            average = averages.get(category, 0)
             progress_data[category] = {
-                'average': round(avg_progress),
-                'trend': 5  # Tendance simulée
+                'average': average,
+                # Écart avec le relevé du début de période
+                'trend': average - start_averages[category] if category in start_averages else 0
             }
         
         return progress_data
     
-    def get_popular_activities(self, filters):
-        activities = Activity.objects.annotate(
-            participation_count=Count('participations')
-        ).order_by('-participation_count')[:5]
+    def get_popular_activities(self, cube_key, start_date, end_date, limit=5):
+        age, group = cube_key
+        activities = self.annotate_participation(
+            GroupActivity.objects.filter(date__date__range=(start_date, end_date)), age, group
+        ).annotate(
+            satisfaction=Avg(
+                'participations__satisfaction_rating',
+                filter=self.participation_filter(age)
+            )
+        ).order_by('-participation_rate', '-participants', '-date')[:limit]
+        activities = list(activities)
+        trends = self.get_participation_trends(age, group, end_date) if activities else {}
         
-        result = []
-        for activity in activities:
-            satisfaction = ActivityRecord.objects.filter(
-                activity=activity
-            ).aggregate(avg=Avg('satisfaction_rating'))['avg'] or 0
-            
-            result.append({
-                'name': activity.name,
-                'type': activity.activity_type,
+        return [
+            {
+                'name': activity.title,
+                'type': activity.get_activity_type_display(),
                 'participation_rate': activity.participation_rate,
-                'satisfaction': round(satisfaction),
-                'trend': 8  # Tendance simulée
-            })
-        
-        return result
+                # Note de 1 à 5 affichée en pourcentage
+                'satisfaction': round(activity.satisfaction * 20) if activity.satisfaction else 0,
+                'trend': trends.get(activity.activity_type, 0)
+            }
+            for activity in activities
+        ]
+    
+    def participation_filter(self, age):
+        # Seuls les enfants présents comptent et notent l'activité
+        condition = Q(participations__attended=True)
+        if age != ALL_AGE_GROUPS:
+            condition &= Q(participations__child__age_group=age)
+        return condition
+    
+    def annotate_participation(self, activities, age, group):
+        """Participants, group size and participation rate of each activity, in the same query"""
+        if group != ALL_CLASS_GROUPS:
+            activities = activities.filter(group_id=group)
+        children = Child.objects.filter(group=OuterRef('group'))
+        if age != ALL_AGE_GROUPS:
+            children = children.filter(age_group=age)
+        return activities.annotate(
+            participants=Count('participations', filter=self.participation_filter(age)),
+            group_size=Coalesce(
+                Subquery(children.order_by().values('group').annotate(total=Count('pk')).values('total')),
+                0
+            ),
+        ).annotate(
+            participation_rate=Case(
+                When(group_size__gt=0, then=F('participants') * 100 / F('group_size')),
+                default=Value(0),
+                output_field=IntegerField()
+            )
+        )
     
-    def get_financial_data(self, start_date, end_date):
-        income = FinancialRecord.objects.filter(
-            record_type='income',
-            date__range=(start_date, end_date)
-        ).aggregate(total=Sum('amount'))['total'] or 0
+    def get_participation_trends(self, age, group, end_date):
+        """Participation rate change per activity type over a rolling window.
+        
+        Compares the PARTICIPATION_TREND_DAYS ending at ``end_date`` with the
+        same number of days just before.
+        """
+        window = timedelta(days=PARTICIPATION_TREND_DAYS)
+        boundary = end_date - window
+        rows = self.annotate_participation(
+            GroupActivity.objects.filter(date__date__gt=boundary - window, date__date__lte=end_date), age, group
+        ).values_list('activity_type', 'date', 'participants', 'group_size')
         
-        expenses = FinancialRecord.objects.filter(
-            record_type='expense',
-            date__range=(start_date, end_date)
-        ).aggregate(total=Sum('amount'))['total'] or 0
+        # type -> [participants, places] pour la fenêtre précédente puis la fenêtre courante
+        totals = {}
+        for activity_type, when, participants, group_size in rows:
+            windows = totals.setdefault(activity_type, [[0, 0], [0, 0]])
+            current = windows[timezone.localdate(when) > boundary]
+            current[0] += participants
+            current[1] += group_size
+        
+        trends = {}
+        for activity_type, (previous, current) in totals.items():
+            previous_rate = previous[0] * 100 / previous[1] if previous[1] else 0
+            current_rate = current[0] * 100 / current[1] if current[1] else 0
+            trends[activity_type] = round(current_rate - previous_rate)
+        return trends
+    
+    def get_financial_data(self, start_date, end_date, previous_start, previous_end):
+        # Mois complets lus dans le grand livre, jours des mois incomplets sommés
+        totals = ledger_totals(start_date, end_date)
+        previous_totals = ledger_totals(previous_start, previous_end)
+        income = totals['income']
+        expenses = totals['expense']
         
         return {
             'income': income,
             'expenses': expenses,
-            'net_profit': income - expenses
+            'net_profit': income - expenses,
+            'income_change': self.get_change(income, previous_totals['income']),
+            'expenses_change': self.get_change(expenses, previous_totals['expense'])
         }
+    
+    def get_change(self, current, previous):
+        # Variation en % par rapport à la période précédente
+        return round((current - previous) / previous * 100, 1) if previous else None
 
 class ReportsDataView(View):
     def get(self, request):
@@ -513,25 +665,19 @@ class ReportsDataView(View):
         return JsonResponse(data)
     
     def get_enrollment_trend_data(self):
-        # Données simulées - à remplacer par des données réelles
-        months = ['Jan', 'Fév', 'Mar', 'Avr', 'Mai', 'Juin', 'Juil', 'Août', 'Sep', 'Oct', 'Nov', 'Déc']
-        current_year = [32, 45, 52, 58, 64, 70, 72, 75, 78, 80, 82, 84]
-        last_year = [28, 38, 44, 50, 56, 62, 65, 68, 70, 72, 74, 75]
+        # Nouvelles inscriptions par mois, année en cours comparée à la précédente
+        this_year = timezone.localdate().year
+        datasets = []
+        for year, color in ((this_year, '#0d6efd'), (this_year - 1, '#6c757d')):
+            datasets.append({
+                'label': str(year),
+                'data': get_monthly_series('enrollments', month_range(date(year, 1, 1), 12)),
+                'borderColor': color
+            })
         
         return {
-            'labels': months,
-            'datasets': [
-                {
-                    'label': '2024-2025',
-                    'data': current_year,
-                    'borderColor': '#0d6efd'
-                },
-                {
-                    'label': '2023-2024',
-                    'data': last_year,
-                    'borderColor': '#6c757d'
-                }
-            ]
+            'labels': MONTH_LABELS,
+            'datasets': datasets
         }
     
     def get_age_distribution_data(self):
@@ -561,23 +707,35 @@ class ReportsDataView(View):
         }
     
     def get_financial_data(self):
-        # Données des 6 derniers mois
-        months = ['Jan', 'Fév', 'Mar', 'Avr', 'Mai', 'Juin']
-        income = [11200, 11800, 12200, 12400, 12600, 12840]
-        expenses = [7800, 7950, 8100, 8200, 8300, 8230]
+        # Données des 6 derniers mois, et des mêmes mois un an plus tôt
+        first = timezone.localdate().replace(day=1)
+        for _ in range(5):
+            first = (first - timedelta(days=1)).replace(day=1)
+        months = month_range(first, 6)
+        last_year = month_range(first.replace(year=first.year - 1), 6)
         
         return {
-            'labels': months,
+            'labels': [MONTH_LABELS[month.month - 1] for month in months],
             'datasets': [
                 {
                     'label': 'Revenus',
-                    'data': income,
+                    'data': get_monthly_series('income', months),
                     'backgroundColor': '#198754'
                 },
                 {
                     'label': 'Dépenses',
-                    'data': expenses,
+                    'data': get_monthly_series('expenses', months),
                     'backgroundColor': '#dc3545'
+                },
+                {
+                    'label': 'Revenus (année précédente)',
+                    'data': get_monthly_series('income', last_year),
+                    'backgroundColor': '#a3cfbb'
+                },
+                {
+                    'label': 'Dépenses (année précédente)',
+                    'data': get_monthly_series('expenses', last_year),
+                    'backgroundColor': '#f1aeb5'
                 }
             ]
-        }
\ No newline at end of file
+        }
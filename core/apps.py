@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'LMSapp.core'
+
+    def ready(self):
+        # Importer les signaux
+        from LMSapp.core.signals import connect_derivative_signals
+        connect_derivative_signals()
@@ -0,0 +1,91 @@
+# core/images.py
+
+import atexit
+import logging
+import os
+import posixpath
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+# Largeur/hauteur maximales de chaque dérivée (l'original n'est jamais modifié)
+DERIVATIVE_SIZES = getattr(settings, 'IMAGE_DERIVATIVE_SIZES', {
+    'thumb': (320, 320),
+    'card': (640, 480),
+    'hero': (1280, 720),
+})
+DERIVATIVE_QUALITY = 80
+
+_executor = None
+logger = logging.getLogger(__name__)
+
+
+def derivative_name(name, size):
+    """Storage name of a derivative, next to the original: news/a.jpg -> news/a.card.webp"""
+    root, _ = posixpath.splitext(name)
+    return f"{root}.{size}.webp"
+
+
+def render_derivatives(source_path, targets, quality=DERIVATIVE_QUALITY):
+    """Resize and recompress one image into every (path, (width, height)) target.
+
+    Runs in a worker process, so it only deals with filesystem paths.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(source_path) as original:
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ('RGB', 'RGBA'):
+            original = original.convert('RGBA' if 'A' in original.getbands() else 'RGB')
+        for target_path, box in targets:
+            image = original.copy()
+            image.thumbnail(box, Image.LANCZOS)
+            temp_path = f"{target_path}.{os.getpid()}.tmp"
+            try:
+                image.save(temp_path, 'WEBP', quality=quality, method=4)
+                os.replace(temp_path, target_path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=getattr(settings, 'IMAGE_DERIVATIVE_WORKERS', 2))
+        atexit.register(_executor.shutdown, wait=True)
+    return _executor
+
+
+def schedule_derivatives(name):
+    """Queue derivative generation for a stored image without blocking the request"""
+    if not name:
+        return None
+    targets = [
+        (default_storage.path(derivative_name(name, size)), box)
+        for size, box in DERIVATIVE_SIZES.items()
+    ]
+    future = _get_executor().submit(render_derivatives, default_storage.path(name), targets)
+    future.add_done_callback(lambda done: _log_failure(done, name))
+    return future
+
+
+def _log_failure(future, name):
+    # Image illisible, disque plein... : derivative_url continue de servir l'original
+    if not future.cancelled() and future.exception() is not None:
+        error = future.exception()
+        logger.error(
+            "Échec de la génération des dérivées de %s", name,
+            exc_info=(type(error), error, error.__traceback__)
+        )
+
+
+def derivative_url(field_file, size):
+    """URL of the requested derivative, or of the original until it has been generated"""
+    if not field_file:
+        return ''
+    name = derivative_name(field_file.name, size)
+    if default_storage.exists(name):
+        return default_storage.url(name)
+    return field_file.url
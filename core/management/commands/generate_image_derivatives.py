@@ -0,0 +1,26 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from LMSapp.core.images import schedule_derivatives
+from LMSapp.core.signals import DERIVATIVE_FIELDS
+
+
+class Command(BaseCommand):
+    help = "Génère les vignettes des images déjà téléversées"
+
+    def handle(self, *args, **options):
+        futures = []
+        for label, field in DERIVATIVE_FIELDS.items():
+            names = apps.get_model(label).objects.exclude(**{field: ''}).exclude(
+                **{f'{field}__isnull': True}
+            ).values_list(field, flat=True).iterator()
+            futures.extend(schedule_derivatives(name) for name in names)
+
+        failures = 0
+        for future in futures:
+            try:
+                future.result()
+            except Exception as error:
+                failures += 1
+                self.stderr.write(str(error))
+        self.stdout.write(self.style.SUCCESS(f"{len(futures) - failures} image(s) traitée(s)"))
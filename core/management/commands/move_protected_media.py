@@ -0,0 +1,32 @@
+import os
+
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from LMSapp.core.media import protected_storage
+
+# Champs fichier stockés dans protected_storage
+PROTECTED_FILE_FIELDS = {
+    'lms.Resource': 'file',
+    'administration.Resource': 'file',
+}
+
+
+class Command(BaseCommand):
+    help = "Déplace les fichiers de ressources encore présents sous MEDIA_ROOT vers PROTECTED_MEDIA_ROOT"
+
+    def handle(self, *args, **options):
+        moved = 0
+        for label, field in PROTECTED_FILE_FIELDS.items():
+            names = apps.get_model(label).objects.exclude(**{field: ''}).exclude(
+                **{f'{field}__isnull': True}
+            ).values_list(field, flat=True).iterator()
+            for name in names:
+                if not default_storage.exists(name) or protected_storage.exists(name):
+                    continue
+                target = protected_storage.path(name)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(default_storage.path(name), target)
+                moved += 1
+        self.stdout.write(self.style.SUCCESS(f"{moved} fichier(s) déplacé(s)"))
@@ -0,0 +1,125 @@
+# core/media.py
+
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe, quote_etag
+
+# None : Django sert les octets ; 'xsendfile' (Apache/lighttpd) ou 'accel' (nginx) : délégation au serveur
+SENDFILE_MODE = getattr(settings, 'MEDIA_SENDFILE_MODE', None)
+ACCEL_REDIRECT_PREFIX = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Fichiers servis uniquement par les vues (hors de MEDIA_ROOT, jamais exposés sous MEDIA_URL)
+protected_storage = FileSystemStorage(location=settings.PROTECTED_MEDIA_ROOT, base_url=ACCEL_REDIRECT_PREFIX)
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single-range header, None to serve the whole file.
+
+    Raises ValueError when the range cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        # En-tête absent, invalide ou multi-plages : réponse complète
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        # Aucun suffixe possible d'une représentation vide
+        if length == 0 or size == 0:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def _if_range_matches(request, etag, mtime):
+    value = request.headers.get('If-Range')
+    if value is None:
+        return True
+    # Comparaison forte (RFC 9110 §13.1.5) : un ETag faible ne correspond jamais
+    if value.startswith('W/'):
+        return False
+    if value.startswith('"'):
+        return value == etag
+    since = parse_http_date_safe(value)
+    return since is not None and int(mtime) <= since
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as handle:
+        handle.seek(start)
+        while length > 0:
+            data = handle.read(min(STREAM_CHUNK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def serve_protected_file(request, field_file, filename=None):
+    """Serve a stored file after the caller's permission checks.
+
+    Supports conditional requests (ETag from mtime/size, Last-Modified),
+    single Range requests guarded by If-Range, and X-Sendfile /
+    X-Accel-Redirect handoff so the web server streams the bytes.
+    """
+    path = field_file.path
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404("Fichier introuvable")
+    etag = quote_etag(f"{stat.st_mtime_ns:x}-{stat.st_size:x}")
+    filename = filename or os.path.basename(field_file.name)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is not None:
+        return response
+
+    if SENDFILE_MODE:
+        # Le serveur web gère lui-même Range/If-Range sur la ressource déléguée
+        response = HttpResponse(content_type=content_type)
+        if SENDFILE_MODE == 'accel':
+            response['X-Accel-Redirect'] = ACCEL_REDIRECT_PREFIX + field_file.name
+        else:
+            response['X-Sendfile'] = path
+    else:
+        byte_range = None
+        if _if_range_matches(request, etag, stat.st_mtime):
+            try:
+                byte_range = parse_range(request.headers.get('Range'), stat.st_size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f"bytes */{stat.st_size}"
+                return response
+
+        if byte_range is None:
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+        else:
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(
+                _read_range(path, start, length), status=206, content_type=content_type
+            )
+            response['Content-Length'] = str(length)
+            response['Content-Range'] = f"bytes {start}-{end}/{stat.st_size}"
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Content-Disposition'] = content_disposition_header(False, filename)
+    return response
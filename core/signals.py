@@ -0,0 +1,36 @@
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import post_init, post_save
+
+from .images import schedule_derivatives
+
+# Champs image servis en vignettes sur les grilles du site
+DERIVATIVE_FIELDS = {
+    'lms.Course': 'image',
+    'core.News': 'image',
+    'core.Activity': 'image',
+    'core.TeamMember': 'photo',
+    'enrollment.Observation': 'photo',
+}
+
+
+def _image_name(value):
+    return getattr(value, 'name', value) or None
+
+
+def remember_image_name(sender, instance, **kwargs):
+    instance._derivative_source = _image_name(instance.__dict__.get(DERIVATIVE_FIELDS[sender._meta.label]))
+
+
+def generate_image_derivatives(sender, instance, **kwargs):
+    name = _image_name(getattr(instance, DERIVATIVE_FIELDS[sender._meta.label]))
+    if name and name != instance._derivative_source:
+        transaction.on_commit(lambda: schedule_derivatives(name))
+    instance._derivative_source = name
+
+
+def connect_derivative_signals():
+    for label in DERIVATIVE_FIELDS:
+        model = apps.get_model(label)
+        post_init.connect(remember_image_name, sender=model)
+        post_save.connect(generate_image_derivatives, sender=model)
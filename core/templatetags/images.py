@@ -0,0 +1,25 @@
+from django import template
+from django.core.files.storage import default_storage
+
+from LMSapp.core.images import DERIVATIVE_SIZES, derivative_name, derivative_url
+
+register = template.Library()
+
+
+@register.filter
+def derivative(field_file, size='card'):
+    """{{ course.image|derivative:'thumb' }} -> URL de la version redimensionnée"""
+    return derivative_url(field_file, size)
+
+
+@register.simple_tag
+def image_srcset(field_file):
+    """Valeur srcset listant les dérivées déjà générées d'une image"""
+    if not field_file:
+        return ''
+    entries = []
+    for size, (width, _) in DERIVATIVE_SIZES.items():
+        name = derivative_name(field_file.name, size)
+        if default_storage.exists(name):
+            entries.append(f"{default_storage.url(name)} {width}w")
+    return ', '.join(entries)
@@ -55,6 +55,13 @@ class ChildEnrollment(models.Model):
         ('O', 'Autre'),
     ]    
     
+    STATUS_CHOICES = [
+        ('pending', 'En attente'),
+        ('approved', 'Approuvée'),
+        ('completed', 'Terminée'),
+        ('cancelled', 'Annulée'),
+    ]
+    
     # Informations enfant
     child_first_name = models.CharField("Prénom", max_length=100)
     child_last_name = models.CharField("Nom", max_length=100)
@@ -86,6 +93,7 @@ class ChildEnrollment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_approved = models.BooleanField("Approuvé", default=False)
+    status = models.CharField("Statut", max_length=20, choices=STATUS_CHOICES, default='pending')
 
     def __str__(self):
         return f"{self.child_first_name} {self.child_last_name} - {self.grade_level}"
@@ -209,6 +217,37 @@ class Activity(models.Model):
         }
         return classes.get(self.activity_type, 'secondary')
 
+class ActivityParticipation(models.Model):
+    activity = models.ForeignKey(
+        Activity,
+        on_delete=models.CASCADE,
+        related_name='participations',
+        verbose_name="Activité"
+    )
+    child = models.ForeignKey(
+        Child,
+        on_delete=models.CASCADE,
+        related_name='participations',
+        verbose_name="Enfant"
+    )
+    attended = models.BooleanField("Présent", default=True)
+    satisfaction_rating = models.PositiveSmallIntegerField(
+        "Satisfaction",
+        validators=[MinValueValidator(1), MaxValueValidator(5)],
+        blank=True,
+        null=True,
+        help_text="De 1 à 5"
+    )
+    created_at = models.DateTimeField("Enregistrée le", auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "Participation"
+        verbose_name_plural = "Participations"
+        unique_together = ['activity', 'child']
+    
+    def __str__(self):
+        return f"{self.child} - {self.activity}"
+
 class Observation(models.Model):
     CATEGORY_CHOICES = [
         ('behavior', 'Comportement'),
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class LmsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'LMSapp.lms'
+
+    def ready(self):
+        # Importer les signaux
+        from LMSapp.lms import signals
@@ -0,0 +1,79 @@
+# lms/cache.py
+
+import time
+
+from django.core.cache import cache
+from django.urls import reverse
+
+from .services import get_course_modules
+
+# À incrémenter quand la forme de l'arbre sérialisé change
+COURSE_TREE_FORMAT = 2
+COURSE_TREE_TIMEOUT = 60 * 60 * 24
+
+
+def _generation_key(course_id):
+    return f'lms:course_tree:gen:{course_id}'
+
+
+def _tree_key(course_id, generation):
+    return f'lms:course_tree:v{COURSE_TREE_FORMAT}:{course_id}:{generation}'
+
+
+def serialize_course_tree(modules):
+    """Compact, cache-friendly copy of a course's modules, resources and activities"""
+    return {
+        'modules': [
+            {
+                'id': module.id,
+                'title': module.title,
+                'order': module.order,
+                'description': module.description,
+                'is_completed': module.is_completed,
+                'resources': [
+                    {
+                        'id': resource.id,
+                        'title': resource.title,
+                        'resource_type': resource.resource_type,
+                        # Fichier servi par ResourceFileView après contrôle d'accès
+                        'file': reverse('resource_file', args=[resource.id]) if resource.file else None,
+                        'url': resource.url,
+                        'description': resource.description,
+                    }
+                    for resource in module.resources.all()
+                ],
+                'activities': [
+                    {
+                        'id': activity.id,
+                        'title': activity.title,
+                        'activity_type': activity.activity_type,
+                        'status': activity.status,
+                        'difficulty': activity.difficulty,
+                        'estimated_time': activity.estimated_time,
+                        'icon': activity.icon,
+                        'url': activity.url,
+                        'category_id': activity.category_id,
+                    }
+                    for activity in module.activities.all()
+                ],
+            }
+            for module in modules
+        ]
+    }
+
+
+def get_course_tree(course):
+    """Serialized module tree of a course, rebuilt only after an invalidation"""
+    generation = cache.get_or_set(_generation_key(course.pk), time.time_ns, None)
+    key = _tree_key(course.pk, generation)
+    tree = cache.get(key)
+    if tree is None:
+        tree = serialize_course_tree(get_course_modules(course))
+        cache.set(key, tree, COURSE_TREE_TIMEOUT)
+    return tree
+
+
+def invalidate_course_tree(course_id):
+    """Move the course to a new generation so every worker stops reading the old tree"""
+    if course_id is not None:
+        cache.set(_generation_key(course_id), time.time_ns(), None)
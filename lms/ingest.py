@@ -0,0 +1,149 @@
+# lms/ingest.py
+
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, transaction
+
+from .models import ChildActivityProgress, InteractiveActivity
+from .services import bump_star_score, bump_user_progress
+
+FLUSH_INTERVAL = getattr(settings, 'PROGRESS_FLUSH_INTERVAL', 5)
+FLUSH_MAX_PENDING = getattr(settings, 'PROGRESS_FLUSH_MAX_PENDING', 500)
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressBuffer:
+    """In-process buffer coalescing ChildActivityProgress reports before writing them.
+
+    Reports for the same (child, activity) are merged keeping the highest
+    stars and completion, then written with one bulk upsert when the
+    buffer reaches ``max_pending`` keys or every ``interval`` seconds.
+    """
+
+    def __init__(self, interval=FLUSH_INTERVAL, max_pending=FLUSH_MAX_PENDING):
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, child_id, activity_id, stars, completion):
+        with self._lock:
+            key = (child_id, activity_id)
+            old_stars, old_completion = self._pending.get(key, (0, 0))
+            self._pending[key] = (max(old_stars, stars), max(old_completion, completion))
+            full = len(self._pending) >= self.max_pending
+        self._ensure_timer()
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Write every pending report; returns the number of rows upserted"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            try:
+                write_progress(pending)
+            except Exception:
+                # Remettre les rapports en file pour la prochaine tentative
+                with self._lock:
+                    for key, (stars, completion) in pending.items():
+                        old_stars, old_completion = self._pending.get(key, (0, 0))
+                        self._pending[key] = (max(old_stars, stars), max(old_completion, completion))
+                raise
+            return len(pending)
+
+    def _ensure_timer(self):
+        if self._timer is None:
+            with self._lock:
+                if self._timer is None:
+                    self._timer = threading.Thread(target=self._run, name='progress-flush', daemon=True)
+                    self._timer.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Échec de l'écriture de %d rapport(s) de progression", len(self))
+            finally:
+                close_old_connections()
+
+
+def write_progress(pending):
+    """Merge reports with the stored rows (never lowering them) and bulk upsert the result"""
+    with transaction.atomic():
+        # Ignorer les rapports d'un enfant ou d'une activité supprimés depuis leur mise en file
+        live_children = set(get_user_model().objects.filter(
+            pk__in={child_id for child_id, _ in pending}
+        ).values_list('pk', flat=True))
+        live_activities = set(InteractiveActivity.objects.filter(
+            pk__in={activity_id for _, activity_id in pending}
+        ).values_list('pk', flat=True))
+        pending = {
+            (child_id, activity_id): report
+            for (child_id, activity_id), report in pending.items()
+            if child_id in live_children and activity_id in live_activities
+        }
+        if not pending:
+            return
+        child_ids = {child_id for child_id, _ in pending}
+        activity_ids = {activity_id for _, activity_id in pending}
+
+        stored = {
+            (row.child_id, row.activity_id): row
+            for row in ChildActivityProgress.objects.select_for_update().filter(
+                child_id__in=child_ids,
+                activity_id__in=activity_ids
+            )
+        }
+
+        rows = []
+        newly_completed = {}
+        new_stars = {}
+        for (child_id, activity_id), (stars, completion) in pending.items():
+            current = stored.get((child_id, activity_id))
+            old_completion = current.completion_rate if current else 0
+            old_stars = current.stars_earned if current else 0
+            if current:
+                stars = max(stars, current.stars_earned)
+                completion = max(completion, current.completion_rate)
+            rows.append(ChildActivityProgress(
+                child_id=child_id,
+                activity_id=activity_id,
+                stars_earned=stars,
+                completion_rate=completion
+            ))
+            if old_completion < 100 <= completion:
+                newly_completed[child_id] = newly_completed.get(child_id, 0) + 1
+            new_stars[child_id] = new_stars.get(child_id, 0) + stars - old_stars
+
+        ChildActivityProgress.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['child', 'activity'],
+            update_fields=['stars_earned', 'completion_rate', 'last_played']
+        )
+
+        # bulk_create n'émet pas post_save : tenir le résumé et le classement à jour ici
+        for child_id, count in newly_completed.items():
+            bump_user_progress(child_id, 'activities_completed', count)
+        for child_id, delta in new_stars.items():
+            bump_star_score(child_id, delta)
+
+
+progress_buffer = ProgressBuffer()
+atexit.register(progress_buffer.flush)
@@ -0,0 +1,16 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from LMSapp.lms.uploads import purge_stale_sessions
+
+
+class Command(BaseCommand):
+    help = "Supprime les téléversements reprenables abandonnés et leurs fichiers partiels"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=2, help="Âge minimal d'inactivité en jours")
+
+    def handle(self, *args, **options):
+        count = purge_stale_sessions(timedelta(days=options['days']))
+        self.stdout.write(self.style.SUCCESS(f"{count} session(s) supprimée(s)"))
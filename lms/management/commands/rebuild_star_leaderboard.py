@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from LMSapp.lms.services import rebuild_star_leaderboard
+
+
+class Command(BaseCommand):
+    help = "Recalcule le classement des étoiles de chaque groupe"
+
+    def handle(self, *args, **options):
+        rebuild_star_leaderboard()
+        self.stdout.write(self.style.SUCCESS("Classement des étoiles recalculé"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from LMSapp.lms.services import recompute_course_counters
+
+
+class Command(BaseCommand):
+    help = "Recalcule les compteurs de contenu des cours et des catégories"
+
+    def handle(self, *args, **options):
+        recompute_course_counters()
+        self.stdout.write(self.style.SUCCESS("Compteurs des cours recalculés"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from LMSapp.lms.telemetry import rollup_segments
+
+
+class Command(BaseCommand):
+    help = "Agrège les segments de télémétrie des activités dans les tables de progression"
+
+    def handle(self, *args, **options):
+        count = rollup_segments()
+        self.stdout.write(self.style.SUCCESS(f"{count} segment(s) agrégé(s)"))
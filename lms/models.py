@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
@@ -6,6 +8,8 @@ from django.urls import reverse
 from django.utils.text import slugify
 from django.utils import timezone
 from django.conf import settings
+from .storage import submission_storage
+from LMSapp.core.media import protected_storage
 
 # Create your models here.
 # lms/models.py
@@ -14,9 +18,17 @@ class CourseCategory(models.Model):
     name = models.CharField(max_length=100)
     color = models.CharField(max_length=7, default='#4361ee')  # Code couleur hex
     icon = models.CharField(max_length=50, default='fas fa-book')
+    # Compteur maintenu par signaux (voir lms/signals.py)
+    course_count = models.PositiveIntegerField(default=0, editable=False)
     
     def __str__(self):
         return self.name
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # Ne pas écraser le compteur mis à jour en F() depuis le chargement
+            kwargs['update_fields'] = ['name', 'color', 'icon']
+        super().save(*args, **kwargs)
 
 
 class Course(models.Model):
@@ -75,6 +87,14 @@ class Course(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Compteurs de contenu maintenus par signaux (voir lms/signals.py)
+    modules_count = models.PositiveIntegerField(default=0, editable=False)
+    resources_count = models.PositiveIntegerField(default=0, editable=False)
+    activities_count = models.PositiveIntegerField(default=0, editable=False)
+    assignments_count = models.PositiveIntegerField(default=0, editable=False)
+    
+    COUNTER_FIELDS = ('modules_count', 'resources_count', 'activities_count', 'assignments_count')
+    
     class Meta:
         ordering = ['-created_at']
     
@@ -84,15 +104,17 @@ class Course(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # Ne pas écraser les compteurs mis à jour en F() depuis le chargement
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
         super().save(*args, **kwargs)
     
     def get_absolute_url(self):
         return reverse('lms:course_detail', kwargs={'pk': self.pk, 'slug': self.slug})
     
-    @property
-    def modules_count(self):
-        return self.modules.count()
-    
 # lms/models.py
 
 User = get_user_model()
@@ -122,7 +144,7 @@ class Resource(models.Model):
     module = models.ForeignKey(Module, on_delete=models.CASCADE, related_name='resources')
     title = models.CharField(max_length=200)
     resource_type = models.CharField(max_length=10, choices=RESOURCE_TYPES)
-    file = models.FileField(upload_to='resources/', null=True, blank=True)
+    file = models.FileField(upload_to='resources/', storage=protected_storage, null=True, blank=True)
     url = models.URLField(null=True, blank=True)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -172,6 +194,9 @@ class Assignment(models.Model):
 
     class Meta:
         ordering = ['-due_date']
+        indexes = [
+            models.Index(fields=['due_date', 'id'], name='lms_assignment_due_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.course})"
@@ -204,15 +229,59 @@ class AssignmentSubmission(models.Model):
     def __str__(self):
         return f"Soumission #{self.id} - {self.assignment.title}"
 
+class StoredBlob(models.Model):
+    """One copy on disk of a submitted content, shared by every SubmittedFile with the same digest"""
+    digest = models.CharField(max_length=64, primary_key=True)
+    name = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.digest} ({self.ref_count} réf.)"
+
 class SubmittedFile(models.Model):
     submission = models.ForeignKey(AssignmentSubmission, on_delete=models.CASCADE, related_name='files')
-    file = models.FileField(upload_to='assignments/submissions/')
+    file = models.FileField(upload_to='assignments/submissions/', storage=submission_storage)
     original_filename = models.CharField(max_length=255)
-    file_size = models.IntegerField()
+    file_size = models.BigIntegerField()
+    digest = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
         return self.original_filename
+    
+    def save(self, *args, **kwargs):
+        if self.file and not self.file._committed:
+            # Écrire le contenu d'abord : son nom de stockage donne l'empreinte
+            self.file.save(self.file.name, self.file.file, save=False)
+        self.digest = self.file.storage.digest_from_name(self.file.name) if self.file else ''
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'file' in update_fields and 'digest' not in update_fields:
+            kwargs['update_fields'] = [*update_fields, 'digest']
+        super().save(*args, **kwargs)
+
+
+class UploadSession(models.Model):
+    """Resumable upload of one file into an AssignmentSubmission, written chunk by chunk"""
+    STATUS_CHOICES = (
+        ('open', 'En cours'),
+        ('complete', 'Terminé'),
+    )
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    submission = models.ForeignKey(AssignmentSubmission, on_delete=models.CASCADE, related_name='upload_sessions')
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    total_size = models.BigIntegerField()
+    received = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
+    submitted_file = models.ForeignKey(SubmittedFile, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.total_size})"
 
 
 User = get_user_model()
@@ -289,6 +358,13 @@ class ChildProfile(models.Model):
     parent = models.ForeignKey(User, on_delete=models.CASCADE, related_name='children')
     birth_date = models.DateField()
     level = models.CharField(max_length=50)  # Petite Section, Moyenne Section, etc.
+    group = models.ForeignKey(
+        'enrollment.ClassGroup',
+        on_delete=models.SET_NULL,
+        related_name='child_profiles',
+        null=True,
+        blank=True
+    )
     avatar = models.ImageField(upload_to='avatars/', null=True, blank=True)
     
     def __str__(self):
@@ -308,6 +384,8 @@ class ActivityRecord(models.Model):
     category = models.ForeignKey(ProgressCategory, on_delete=models.CASCADE)
     date = models.DateField()
     duration = models.PositiveIntegerField(help_text="Durée en minutes")
+    # Total exact cumulé par la télémétrie ; duration en est l'arrondi à la minute supérieure
+    duration_seconds = models.PositiveIntegerField(default=0, editable=False)
     score = models.PositiveIntegerField()
     max_score = models.PositiveIntegerField(default=10)
     
@@ -393,6 +471,75 @@ class ChildProgress(models.Model):
 
 
 
+class CohortProgressAverage(models.Model):
+    """Running score totals of ChildProgress rows per cohort (group/level) and category"""
+    group = models.ForeignKey(
+        'enrollment.ClassGroup',
+        on_delete=models.CASCADE,
+        related_name='progress_averages',
+        null=True,
+        blank=True
+    )
+    level = models.CharField(max_length=50, blank=True, default='')
+    category = models.CharField(max_length=50)
+    score_total = models.BigIntegerField(default=0)
+    entries = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Moyennes des groupes"
+        unique_together = ('group', 'level', 'category')
+
+    def __str__(self):
+        return f"{self.group or self.level} - {self.category}: {self.average}%"
+
+    @property
+    def average(self):
+        return round(self.score_total / self.entries) if self.entries else 0
+
+
+
+class StarScore(models.Model):
+    """Stars of a child (star rewards + activity stars), ordered per ClassGroup for the leaderboard"""
+    child = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='star_score')
+    group = models.ForeignKey(
+        'enrollment.ClassGroup',
+        on_delete=models.SET_NULL,
+        related_name='star_scores',
+        null=True,
+        blank=True
+    )
+    stars = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Classements des étoiles"
+        indexes = [
+            # Top-N et rang : parcours de l'index dans l'ordre du classement
+            models.Index(fields=['group', '-stars', 'child'], name='lms_starscore_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.child} - {self.stars} étoiles"
+
+
+
+class UserProgressSummary(models.Model):
+    """Per-user learning counters, maintained incrementally by lms/signals.py"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='progress_summary')
+    completed_enrollments = models.PositiveIntegerField(default=0)
+    badges = models.PositiveIntegerField(default=0)
+    activities_completed = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Résumés de progression"
+
+    def __str__(self):
+        return f"{self.user} - {self.completed_enrollments} cours, {self.badges} badges"
+
+
+
 class Reward(models.Model):
     REWARD_TYPES = (
         ('star', 'Étoile'),
@@ -0,0 +1,474 @@
+# lms/services.py
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, FilteredRelation, OuterRef, Prefetch, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import (
+    ActivityCategory, Assignment, ChildActivityProgress, ChildProfile, ChildProgress,
+    CohortProgressAverage, Course, CourseCategory, InteractiveActivity, Module,
+    Resource, Reward, StarScore, StoredBlob, SubmittedFile, User, UserProgressSummary
+)
+from LMSapp.enrollment.models import ChildEnrollment
+
+
+def get_course_modules(course):
+    """Modules of a course with their resources and activities prefetched"""
+    return Module.objects.filter(course=course).prefetch_related(
+        Prefetch('resources', queryset=Resource.objects.all()),
+        Prefetch('activities', queryset=InteractiveActivity.objects.all())
+    ).order_by('order')
+
+
+def get_progress_map(child, activities):
+    """Map activity id -> ChildActivityProgress for a child in a single query.
+
+    Activities the child has never played get an unsaved default row so
+    callers can read ``stars_earned``/``completion_rate`` without a lookup.
+    """
+    saved = {
+        progress.activity_id: progress
+        for progress in ChildActivityProgress.objects.filter(child=child)
+    }
+
+    progress_map = {}
+    for activity in activities:
+        progress = saved.get(activity.pk)
+        if progress is None:
+            progress = ChildActivityProgress(
+                child=child,
+                activity=activity,
+                stars_earned=0,
+                completion_rate=0
+            )
+        else:
+            # Évite une requête si le template remonte vers l'activité
+            progress.activity = activity
+        progress_map[activity.pk] = progress
+
+    return progress_map
+
+
+def get_activities_with_progress(activities, child):
+    """Pair each activity with the child's progress (None without a child)"""
+    activities = list(activities)
+    progress_map = get_progress_map(child, activities) if child else {}
+
+    return [
+        {
+            'activity': activity,
+            'progress': progress_map.get(activity.pk)
+        }
+        for activity in activities
+    ]
+
+
+def _category_stats(completed, total):
+    return {
+        'completed': completed,
+        'total': total,
+        'percent': round((completed / total) * 100) if total > 0 else 0
+    }
+
+
+def get_category_progress(child):
+    """Completion per ActivityCategory and total stars for a child, in one grouped query"""
+    categories = ActivityCategory.objects.annotate(
+        child_progress=FilteredRelation(
+            'interactiveactivity__childactivityprogress',
+            condition=Q(interactiveactivity__childactivityprogress__child=child)
+        )
+    ).annotate(
+        total=Count('interactiveactivity'),
+        completed=Count('child_progress', filter=Q(child_progress__completion_rate=100)),
+        stars=Sum('child_progress__stars_earned')
+    ).values('name', 'total', 'completed', 'stars')
+
+    category_progress = {}
+    total_stars = 0
+    for row in categories:
+        category_progress[row['name']] = _category_stats(row['completed'], row['total'])
+        total_stars += row['stars'] or 0
+
+    return {
+        'categories': category_progress,
+        'total_stars': total_stars
+    }
+
+
+def get_children_of_parent(parent):
+    """Child users attached to a parent through their ChildProfile"""
+    return User.objects.filter(child_profile__parent=parent)
+
+
+def get_children_of_group(group):
+    """Child users attached to a ClassGroup through their ChildProfile"""
+    return User.objects.filter(child_profile__group=group)
+
+
+def get_category_progress_batch(children):
+    """Same as get_category_progress for many children, in two grouped queries
+
+    Returns a dict keyed by child id; children without any progress still
+    get an entry with every category at 0.
+    """
+    child_ids = [getattr(child, 'pk', child) for child in children]
+    categories = list(
+        ActivityCategory.objects.annotate(total=Count('interactiveactivity')).values('id', 'name', 'total')
+    )
+
+    rows = ChildActivityProgress.objects.filter(
+        child_id__in=child_ids
+    ).values('child_id', 'activity__category_id').annotate(
+        completed=Count('id', filter=Q(completion_rate=100)),
+        stars=Sum('stars_earned')
+    )
+    per_child = {}
+    for row in rows:
+        per_child.setdefault(row['child_id'], {})[row['activity__category_id']] = row
+
+    result = {}
+    for child_id in child_ids:
+        child_rows = per_child.get(child_id, {})
+        category_progress = {}
+        total_stars = 0
+        for category in categories:
+            row = child_rows.get(category['id'])
+            completed = row['completed'] if row else 0
+            category_progress[category['name']] = _category_stats(completed, category['total'])
+            total_stars += (row['stars'] or 0) if row else 0
+        result[child_id] = {
+            'categories': category_progress,
+            'total_stars': total_stars
+        }
+
+    return result
+
+
+def get_cohort_key(child_id):
+    """(group_id, level) of the cohort a child is compared against, (None, '') without a profile"""
+    cohort = ChildProfile.objects.filter(user_id=child_id).values_list('group_id', 'level').first()
+    return cohort or (None, '')
+
+
+def apply_cohort_score_delta(cohort, category, score_delta, entries_delta):
+    """Shift the running totals of a cohort/category rollup row with F() updates"""
+    group_id, level = cohort
+    rows = CohortProgressAverage.objects.filter(group_id=group_id, level=level, category=category)
+    if entries_delta <= 0:
+        # Une baisse ne crée jamais de ligne : sans ligne, il n'y a rien à retirer
+        rows.update(score_total=F('score_total') + score_delta, entries=F('entries') + entries_delta)
+        return
+    with transaction.atomic():
+        average, _ = CohortProgressAverage.objects.get_or_create(
+            group_id=group_id,
+            level=level,
+            category=category
+        )
+        CohortProgressAverage.objects.filter(pk=average.pk).update(
+            score_total=F('score_total') + score_delta,
+            entries=F('entries') + entries_delta
+        )
+
+
+def move_cohort_entries(child_id, old_cohort, new_cohort):
+    """Move a child's category scores from one cohort rollup to another"""
+    rows = ChildProgress.objects.filter(
+        child_id=child_id,
+        course__isnull=True,
+        category__isnull=False
+    ).exclude(category='').values('category').annotate(score_total=Sum('score'), entries=Count('id'))
+    for row in rows:
+        score_total = row['score_total'] or 0
+        apply_cohort_score_delta(old_cohort, row['category'], -score_total, -row['entries'])
+        apply_cohort_score_delta(new_cohort, row['category'], score_total, row['entries'])
+
+
+def get_cohort_averages(profile, categories):
+    """Cohort average score by category name, read from the rollup table"""
+    averages = CohortProgressAverage.objects.filter(
+        group_id=profile.group_id if profile else None,
+        level=profile.level if profile else '',
+        category__in=categories
+    )
+    return {average.category: average.average for average in averages}
+
+
+def rebuild_cohort_averages():
+    """Recompute every CohortProgressAverage row from ChildProgress"""
+    rows = ChildProgress.objects.filter(
+        course__isnull=True,
+        category__isnull=False
+    ).values(
+        'child__child_profile__group_id', 'child__child_profile__level', 'category'
+    ).annotate(
+        score_total=Sum('score'),
+        entries=Count('id')
+    )
+
+    with transaction.atomic():
+        CohortProgressAverage.objects.all().delete()
+        CohortProgressAverage.objects.bulk_create([
+            CohortProgressAverage(
+                group_id=row['child__child_profile__group_id'],
+                level=row['child__child_profile__level'] or '',
+                category=row['category'],
+                score_total=row['score_total'] or 0,
+                entries=row['entries']
+            )
+            for row in rows
+        ])
+
+
+def _count_subquery(queryset, field):
+    """Correlated COUNT of ``queryset`` rows whose ``field`` matches the outer pk"""
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(
+                total=Count('pk')
+            ).values('total')
+        ),
+        0
+    )
+
+
+def recompute_course_counters():
+    """Rebuild the denormalized counters of Course and CourseCategory from the content tables"""
+    with transaction.atomic():
+        Course.objects.update(
+            modules_count=_count_subquery(Module.objects.all(), 'course'),
+            resources_count=_count_subquery(Resource.objects.all(), 'module__course'),
+            activities_count=_count_subquery(InteractiveActivity.objects.all(), 'module__course'),
+            assignments_count=_count_subquery(Assignment.objects.all(), 'course')
+        )
+        CourseCategory.objects.update(
+            course_count=Coalesce(
+                Subquery(
+                    Course.objects.filter(category=OuterRef('name')).order_by().values('category').annotate(
+                        total=Count('pk')
+                    ).values('total')
+                ),
+                0
+            )
+        )
+
+
+# Pas de catalogue de badges : objectif affiché aux familles
+BADGES_GOAL = 20
+USER_PROGRESS_TIMEOUT = 60 * 60
+CATALOG_TOTALS_KEY = 'lms:catalog_totals'
+
+
+def _user_progress_key(user_id):
+    return f'lms:user_progress:{user_id}'
+
+
+def rebuild_user_progress(user_id):
+    """Recompute a user's UserProgressSummary from the source tables"""
+    summary, _ = UserProgressSummary.objects.update_or_create(
+        user_id=user_id,
+        defaults={
+            'completed_enrollments': ChildEnrollment.objects.filter(parent_id=user_id, status='completed').count(),
+            'badges': Reward.objects.filter(child_id=user_id, reward_type='badge').count(),
+            'activities_completed': ChildActivityProgress.objects.filter(
+                child_id=user_id,
+                completion_rate__gte=100
+            ).count(),
+        }
+    )
+    return summary
+
+
+def bump_counter(model, pk, counter, delta, rebuild):
+    """F() update of a denormalized counter row, rebuilt with ``rebuild(pk)`` when missing.
+
+    Only an increase rebuilds a missing row: a decrease comes from a
+    deletion, possibly the cascade delete of the owner, and must not
+    recreate the row.
+    """
+    updated = model.objects.filter(pk=pk).update(**{counter: F(counter) + delta})
+    if not updated and delta > 0:
+        # Premier événement pour cette ligne : l'état courant inclut déjà ce changement
+        rebuild(pk)
+
+
+def bump_user_progress(user_id, counter, delta):
+    """Shift one counter of a user's summary and drop the cached copy on commit"""
+    bump_counter(UserProgressSummary, user_id, counter, delta, rebuild_user_progress)
+    transaction.on_commit(lambda: cache.delete(_user_progress_key(user_id)))
+
+
+def get_catalog_totals():
+    """Course and activity totals shared by every user's progress widget"""
+    return cache.get_or_set(
+        CATALOG_TOTALS_KEY,
+        lambda: {
+            'courses': Course.objects.count(),
+            'activities': InteractiveActivity.objects.count(),
+        },
+        None
+    )
+
+
+def invalidate_catalog_totals():
+    cache.delete(CATALOG_TOTALS_KEY)
+
+
+def get_user_progress(user):
+    """Get progress data for authenticated users"""
+    if not user.is_authenticated:
+        return None
+
+    key = _user_progress_key(user.pk)
+    counts = cache.get(key)
+    if counts is None:
+        summary = UserProgressSummary.objects.filter(pk=user.pk).first() or rebuild_user_progress(user.pk)
+        counts = {
+            'completed': summary.completed_enrollments,
+            'badges': summary.badges,
+            'activities': summary.activities_completed,
+        }
+        cache.set(key, counts, USER_PROGRESS_TIMEOUT)
+
+    totals = get_catalog_totals()
+    return {
+        'completed': counts['completed'],
+        'total': totals['courses'],
+        'badges': counts['badges'],
+        'total_badges': BADGES_GOAL,
+        'activities': counts['activities'],
+        'total_activities': totals['activities']
+    }
+
+
+class BlobMissing(Exception):
+    """The blob of a new reference was deleted by a concurrent release"""
+
+
+def _blob_storage():
+    return SubmittedFile._meta.get_field('file').storage
+
+
+def attach_submitted_file(submission, upload):
+    """Store an upload by content digest and record it as a SubmittedFile"""
+    field = SubmittedFile._meta.get_field('file')
+    for attempt in range(2):
+        name = field.storage.save(field.generate_filename(None, upload.name), upload)
+        try:
+            with transaction.atomic():
+                return SubmittedFile.objects.create(
+                    submission=submission,
+                    file=name,
+                    original_filename=upload.name,
+                    file_size=upload.size
+                )
+        except BlobMissing:
+            # Copie existante supprimée entre l'écriture et la référence : réécrire le contenu
+            if attempt:
+                raise
+
+
+def acquire_blob(digest, name, size):
+    """Count one more SubmittedFile pointing at a stored blob.
+
+    Raises BlobMissing if a concurrent release unlinked the file since it
+    was written; the caller's transaction must then be rolled back.
+    """
+    with transaction.atomic():
+        StoredBlob.objects.get_or_create(digest=digest, defaults={'name': name, 'size': size})
+        blob = StoredBlob.objects.select_for_update().filter(pk=digest).first()
+        if blob is None or (blob.ref_count == 0 and not _blob_storage().exists(blob.name)):
+            raise BlobMissing(digest)
+        StoredBlob.objects.filter(pk=digest).update(ref_count=F('ref_count') + 1)
+
+
+def release_blob(digest):
+    """Drop one reference to a blob and delete its file once nothing points at it"""
+    with transaction.atomic():
+        blob = StoredBlob.objects.select_for_update().filter(pk=digest).first()
+        if blob is None:
+            return
+        if blob.ref_count > 1:
+            StoredBlob.objects.filter(pk=digest).update(ref_count=F('ref_count') - 1)
+            return
+        # Fichier supprimé sous le verrou : un acquire_blob concurrent attend
+        # ce verrou puis constate l'absence du fichier au lieu de le référencer
+        blob.delete()
+        _blob_storage().delete(blob.name)
+
+
+def _reward_stars(**lookup):
+    return Reward.objects.filter(reward_type='star', **lookup)
+
+
+def rebuild_star_score(child_id):
+    """Recompute a child's StarScore from star rewards and activity stars"""
+    activity_stars = ChildActivityProgress.objects.filter(child_id=child_id).aggregate(
+        total=Coalesce(Sum('stars_earned'), 0)
+    )['total']
+    score, _ = StarScore.objects.update_or_create(
+        child_id=child_id,
+        defaults={
+            'group_id': ChildProfile.objects.filter(user_id=child_id).values_list('group_id', flat=True).first(),
+            'stars': _reward_stars(child_id=child_id).count() + activity_stars,
+        }
+    )
+    return score
+
+
+def bump_star_score(child_id, delta):
+    """Shift a child's leaderboard score with an F() update"""
+    if delta:
+        bump_counter(StarScore, child_id, 'stars', delta, rebuild_star_score)
+
+
+def rebuild_star_leaderboard():
+    """Recompute every StarScore row in three grouped queries"""
+    stars = {}
+    for row in _reward_stars().values('child_id').annotate(total=Count('id')):
+        stars[row['child_id']] = row['total']
+    for row in ChildActivityProgress.objects.values('child_id').annotate(total=Sum('stars_earned')):
+        stars[row['child_id']] = stars.get(row['child_id'], 0) + (row['total'] or 0)
+    groups = dict(ChildProfile.objects.values_list('user_id', 'group_id'))
+
+    with transaction.atomic():
+        StarScore.objects.all().delete()
+        StarScore.objects.bulk_create([
+            StarScore(child_id=child_id, group_id=groups.get(child_id), stars=stars.get(child_id, 0))
+            for child_id in set(stars) | set(groups)
+        ])
+
+
+def get_group_leaderboard(group, limit=10):
+    """Top ``limit`` children of a ClassGroup by stars, ties sharing the same rank"""
+    scores = StarScore.objects.filter(group=group).select_related('child').order_by('-stars', 'child_id')[:limit]
+
+    leaderboard = []
+    for position, score in enumerate(scores, start=1):
+        rank = leaderboard[-1]['rank'] if leaderboard and leaderboard[-1]['stars'] == score.stars else position
+        leaderboard.append({
+            'rank': rank,
+            'child': score.child,
+            'stars': score.stars
+        })
+    return leaderboard
+
+
+def get_child_rank(child):
+    """Rank of a child in their ClassGroup, None when the child has no group.
+
+    The rank counts the (group, -stars) index entries above the child, so
+    it costs O(rank), bounded by the size of a class, not O(log n).
+    """
+    child_id = getattr(child, 'pk', child)
+    score = StarScore.objects.filter(pk=child_id).first() or rebuild_star_score(child_id)
+    if score.group_id is None:
+        return None
+
+    group_scores = StarScore.objects.filter(group_id=score.group_id)
+    return {
+        'rank': group_scores.filter(stars__gt=score.stars).count() + 1,
+        'stars': score.stars,
+        'total': group_scores.count()
+    }
@@ -0,0 +1,338 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+from .cache import invalidate_course_tree
+from .models import (
+    Assignment, ChildActivityProgress, ChildProfile, ChildProgress, Course, CourseCategory,
+    InteractiveActivity, Module, Resource, Reward, StarScore, SubmittedFile
+)
+from .services import (
+    acquire_blob, apply_cohort_score_delta, bump_star_score, bump_user_progress, get_cohort_key,
+    invalidate_catalog_totals, move_cohort_entries, rebuild_star_score, release_blob
+)
+from LMSapp.enrollment.models import ChildEnrollment
+
+
+def _cohort_entry(instance):
+    """(category, score) counted in the cohort rollup, None for course-level rows"""
+    values = instance.__dict__
+    if values.get('course_id') is not None or not values.get('category'):
+        return None
+    return values['category'], values.get('score') or 0
+
+
+@receiver(post_init, sender=ChildProgress)
+def remember_cohort_entry(sender, instance, **kwargs):
+    # Garder l'état chargé pour calculer le delta au prochain save
+    instance._cohort_entry = _cohort_entry(instance)
+
+
+@receiver(post_save, sender=ChildProgress)
+def update_cohort_averages(sender, instance, created, **kwargs):
+    old = None if created else instance._cohort_entry
+    new = _cohort_entry(instance)
+    instance._cohort_entry = new
+    if old == new:
+        return
+
+    cohort = get_cohort_key(instance.child_id)
+    if old and new and old[0] == new[0]:
+        apply_cohort_score_delta(cohort, new[0], new[1] - old[1], 0)
+        return
+    if old:
+        apply_cohort_score_delta(cohort, old[0], -old[1], -1)
+    if new:
+        apply_cohort_score_delta(cohort, new[0], new[1], 1)
+
+
+@receiver(post_delete, sender=ChildProgress)
+def remove_from_cohort_averages(sender, instance, **kwargs):
+    old = instance._cohort_entry
+    if old:
+        apply_cohort_score_delta(get_cohort_key(instance.child_id), old[0], -old[1], -1)
+
+
+# Sans profil, les scores d'un enfant comptent dans la cohorte (None, '')
+NO_COHORT = (None, '')
+
+
+def _profile_cohort(instance):
+    values = instance.__dict__
+    return values.get('group_id'), values.get('level') or ''
+
+
+@receiver(post_init, sender=ChildProfile)
+def remember_profile_cohort(sender, instance, **kwargs):
+    instance._cohort = _profile_cohort(instance)
+
+
+@receiver(post_save, sender=ChildProfile)
+def move_scores_to_cohort(sender, instance, created, **kwargs):
+    old = NO_COHORT if created else instance._cohort
+    new = _profile_cohort(instance)
+    if old != new:
+        move_cohort_entries(instance.user_id, old, new)
+    instance._cohort = new
+
+
+@receiver(post_delete, sender=ChildProfile)
+def move_scores_out_of_cohort(sender, instance, **kwargs):
+    # Reçu aussi pendant la suppression en cascade de l'utilisateur : les lignes
+    # de progrès encore présentes seront ensuite retirées de la cohorte (None, '')
+    if instance._cohort != NO_COHORT:
+        move_cohort_entries(instance.user_id, instance._cohort, NO_COHORT)
+
+
+def _invalidate_on_commit(course_id):
+    transaction.on_commit(lambda: invalidate_course_tree(course_id))
+
+
+def _module_course_id(module_id):
+    return Module.objects.filter(pk=module_id).values_list('course_id', flat=True).first()
+
+
+@receiver([post_save, post_delete], sender=Course)
+def invalidate_tree_for_course(sender, instance, **kwargs):
+    _invalidate_on_commit(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Module)
+def invalidate_tree_for_module(sender, instance, **kwargs):
+    _invalidate_on_commit(instance.course_id)
+
+
+@receiver([post_save, post_delete], sender=Resource)
+@receiver([post_save, post_delete], sender=InteractiveActivity)
+def invalidate_tree_for_module_content(sender, instance, **kwargs):
+    _invalidate_on_commit(_module_course_id(instance.module_id))
+
+
+# Compteurs de contenu dénormalisés sur Course et CourseCategory
+
+def _bump_course(counter, delta, **lookup):
+    # Plancher à 0 : une ligne antérieure aux compteurs (non recalculée) part de 0
+    Course.objects.filter(**lookup).update(**{counter: Greatest(F(counter) + delta, 0)})
+
+
+def _bump_category(name, delta):
+    if name:
+        CourseCategory.objects.filter(name=name).update(course_count=Greatest(F('course_count') + delta, 0))
+
+
+@receiver(post_init, sender=Course)
+def remember_course_category(sender, instance, **kwargs):
+    instance._counted_category = instance.__dict__.get('category')
+
+
+@receiver(pre_save, sender=Course)
+def load_course_category(sender, instance, **kwargs):
+    # Cours chargé sans sa catégorie (only/defer) : relire celle qui est comptée
+    if instance._counted_category is None and not instance._state.adding:
+        instance._counted_category = sender.objects.filter(pk=instance.pk).values_list(
+            'category', flat=True
+        ).first()
+
+
+@receiver(post_save, sender=Course)
+def count_course_in_category(sender, instance, created, **kwargs):
+    old = None if created else instance._counted_category
+    if old != instance.category:
+        _bump_category(old, -1)
+        _bump_category(instance.category, 1)
+    instance._counted_category = instance.category
+
+
+@receiver(post_delete, sender=Course)
+def uncount_course_in_category(sender, instance, **kwargs):
+    _bump_category(instance._counted_category, -1)
+
+
+@receiver(post_init, sender=CourseCategory)
+def remember_category_name(sender, instance, **kwargs):
+    instance._counted_name = instance.__dict__.get('name')
+
+
+@receiver(post_save, sender=CourseCategory)
+def recount_renamed_category(sender, instance, created, **kwargs):
+    # Les cours désignent leur catégorie par son nom : une catégorie créée ou
+    # renommée reprend les cours qui portent déjà ce nom
+    if created or instance._counted_name != instance.name:
+        sender.objects.filter(pk=instance.pk).update(
+            course_count=Course.objects.filter(category=instance.name).count()
+        )
+    instance._counted_name = instance.name
+
+
+COURSE_COUNTERS = {
+    Module: ('modules_count', 'course_id', 'pk'),
+    Assignment: ('assignments_count', 'course_id', 'pk'),
+    Resource: ('resources_count', 'module_id', 'modules'),
+    InteractiveActivity: ('activities_count', 'module_id', 'modules'),
+}
+
+
+def remember_counted_parent(sender, instance, **kwargs):
+    instance._counted_parent = instance.__dict__.get(COURSE_COUNTERS[sender][1])
+
+
+def count_course_content(sender, instance, created, **kwargs):
+    counter, parent_field, lookup = COURSE_COUNTERS[sender]
+    old = None if created else instance._counted_parent
+    new = getattr(instance, parent_field)
+    if old != new:
+        if old is not None:
+            _bump_course(counter, -1, **{lookup: old})
+        _bump_course(counter, 1, **{lookup: new})
+    instance._counted_parent = new
+
+
+def uncount_course_content(sender, instance, **kwargs):
+    counter, _, lookup = COURSE_COUNTERS[sender]
+    if instance._counted_parent is not None:
+        _bump_course(counter, -1, **{lookup: instance._counted_parent})
+
+
+for content_model in COURSE_COUNTERS:
+    post_init.connect(remember_counted_parent, sender=content_model)
+    post_save.connect(count_course_content, sender=content_model)
+    post_delete.connect(uncount_course_content, sender=content_model)
+
+
+# Résumé de progression par utilisateur (UserProgressSummary)
+
+PROGRESS_SUMMARY_COUNTERS = {
+    ChildEnrollment: ('completed_enrollments', 'parent_id', lambda values: values.get('status') == 'completed'),
+    Reward: ('badges', 'child_id', lambda values: values.get('reward_type') == 'badge'),
+    ChildActivityProgress: (
+        'activities_completed', 'child_id', lambda values: (values.get('completion_rate') or 0) >= 100
+    ),
+}
+
+
+def _summary_entry(sender, instance):
+    _, owner_field, is_counted = PROGRESS_SUMMARY_COUNTERS[sender]
+    values = instance.__dict__
+    return values.get(owner_field), is_counted(values)
+
+
+def remember_summary_entry(sender, instance, **kwargs):
+    instance._summary_entry = _summary_entry(sender, instance)
+
+
+def count_in_progress_summary(sender, instance, created, **kwargs):
+    counter = PROGRESS_SUMMARY_COUNTERS[sender][0]
+    old_owner, old_counted = (None, False) if created else instance._summary_entry
+    new_owner, new_counted = _summary_entry(sender, instance)
+    if (old_owner, old_counted) != (new_owner, new_counted):
+        if old_counted:
+            bump_user_progress(old_owner, counter, -1)
+        if new_counted:
+            bump_user_progress(new_owner, counter, 1)
+    instance._summary_entry = (new_owner, new_counted)
+
+
+def uncount_from_progress_summary(sender, instance, **kwargs):
+    owner, counted = instance._summary_entry
+    if counted:
+        bump_user_progress(owner, PROGRESS_SUMMARY_COUNTERS[sender][0], -1)
+
+
+for summary_model in PROGRESS_SUMMARY_COUNTERS:
+    post_init.connect(remember_summary_entry, sender=summary_model)
+    post_save.connect(count_in_progress_summary, sender=summary_model)
+    post_delete.connect(uncount_from_progress_summary, sender=summary_model)
+
+
+# Classement des étoiles par groupe (StarScore)
+
+STAR_SOURCES = {
+    Reward: lambda values: 1 if values.get('reward_type') == 'star' else 0,
+    ChildActivityProgress: lambda values: values.get('stars_earned') or 0,
+}
+
+
+def _star_entry(sender, instance):
+    values = instance.__dict__
+    return values.get('child_id'), STAR_SOURCES[sender](values)
+
+
+def remember_star_entry(sender, instance, **kwargs):
+    instance._star_entry = _star_entry(sender, instance)
+
+
+def count_in_star_score(sender, instance, created, **kwargs):
+    old_child, old_stars = (None, 0) if created else instance._star_entry
+    new_child, new_stars = _star_entry(sender, instance)
+    if old_child == new_child:
+        bump_star_score(new_child, new_stars - old_stars)
+    else:
+        if old_child is not None:
+            bump_star_score(old_child, -old_stars)
+        bump_star_score(new_child, new_stars)
+    instance._star_entry = (new_child, new_stars)
+
+
+def uncount_from_star_score(sender, instance, **kwargs):
+    child_id, stars = instance._star_entry
+    bump_star_score(child_id, -stars)
+
+
+for star_model in STAR_SOURCES:
+    post_init.connect(remember_star_entry, sender=star_model)
+    post_save.connect(count_in_star_score, sender=star_model)
+    post_delete.connect(uncount_from_star_score, sender=star_model)
+
+
+@receiver(post_save, sender=ChildProfile)
+def move_star_score_to_group(sender, instance, **kwargs):
+    if not StarScore.objects.filter(pk=instance.user_id).update(group_id=instance.group_id):
+        rebuild_star_score(instance.user_id)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=InteractiveActivity)
+def invalidate_totals_on_create(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(invalidate_catalog_totals)
+
+
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=InteractiveActivity)
+def invalidate_totals_on_delete(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_catalog_totals)
+
+
+# Comptage des références aux fichiers stockés par empreinte
+
+@receiver(post_init, sender=SubmittedFile)
+def remember_submitted_digest(sender, instance, **kwargs):
+    instance._counted_digest = instance.__dict__.get('digest')
+
+
+@receiver(pre_save, sender=SubmittedFile)
+def load_submitted_digest(sender, instance, **kwargs):
+    # Fichier chargé sans son empreinte (only/defer) : relire celle qui est comptée
+    if instance._counted_digest is None and not instance._state.adding:
+        instance._counted_digest = sender.objects.filter(pk=instance.pk).values_list(
+            'digest', flat=True
+        ).first()
+
+
+@receiver(post_save, sender=SubmittedFile)
+def acquire_submitted_blob(sender, instance, created, **kwargs):
+    old = None if created else instance._counted_digest
+    if old != instance.digest:
+        # Prendre la nouvelle référence avant de lâcher l'ancienne
+        if instance.digest:
+            acquire_blob(instance.digest, instance.file.name, instance.file_size)
+        if old:
+            release_blob(old)
+    instance._counted_digest = instance.digest
+
+
+@receiver(post_delete, sender=SubmittedFile)
+def release_submitted_blob(sender, instance, **kwargs):
+    if instance._counted_digest:
+        release_blob(instance._counted_digest)
@@ -0,0 +1,66 @@
+# lms/storage.py
+
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+
+
+DIGEST_PATTERN = re.compile(r'[0-9a-f]{64}')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Filesystem storage keeping one copy of each distinct content, named by its SHA-256 digest.
+
+    Uploads are streamed to a temporary file in chunks while being hashed;
+    if a blob with the same digest already exists the temporary copy is
+    dropped, so a repeated upload costs one hash and no extra disk.
+    """
+    chunk_size = 64 * 1024
+
+    def get_available_name(self, name, max_length=None):
+        # Le nom final dépend du contenu : il est choisi dans _save
+        return name
+
+    def _save(self, name, content):
+        directory = posixpath.dirname(name)
+        os.makedirs(self.path(directory or '.'), exist_ok=True)
+
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=self.path(directory or '.'), suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks(self.chunk_size):
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+
+            hexdigest = digest.hexdigest()
+            blob_name = posixpath.join(directory, hexdigest[:2], hexdigest)
+            blob_path = self.path(blob_name)
+            if os.path.exists(blob_path):
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                os.replace(temp_path, blob_path)
+                if self.file_permissions_mode is not None:
+                    os.chmod(blob_path, self.file_permissions_mode)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        return blob_name
+
+    @staticmethod
+    def digest_from_name(name):
+        """SHA-256 digest a blob is named after, '' for a name this storage did not choose"""
+        digest = posixpath.basename(name or '')
+        return digest if DIGEST_PATTERN.fullmatch(digest) else ''
+
+
+submission_storage = ContentAddressedStorage()
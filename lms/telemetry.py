@@ -0,0 +1,344 @@
+# lms/telemetry.py
+
+import atexit
+import fcntl
+import glob
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .ingest import write_progress
+from .models import (
+    ActivityRecord, ChildActivityProgress, ChildProgress, InteractiveActivity, ProgressCategory
+)
+
+# Types d'événements d'une session de jeu
+EVENT_START = 1
+EVENT_ANSWER = 2
+EVENT_FINISH = 3
+EVENT_TIME = 4
+EVENT_KINDS = {
+    'start': EVENT_START,
+    'answer': EVENT_ANSWER,
+    'finish': EVENT_FINISH,
+    'time': EVENT_TIME,
+}
+
+# kind, child, activity, horodatage, valeur a, valeur b
+#   answer : a = réponse correcte (0/1)
+#   finish : a = étoiles, b = complétion (%)
+#   time   : a = secondes passées sur l'activité
+RECORD = struct.Struct('<B3xIIdII')
+
+SEGMENT_MAX_BYTES = getattr(settings, 'TELEMETRY_SEGMENT_MAX_BYTES', 4 * 1024 * 1024)
+SEGMENT_MAX_AGE = getattr(settings, 'TELEMETRY_SEGMENT_MAX_AGE', 60)
+# Un segment ouvert plus ancien appartient à un processus disparu
+ORPHAN_SEGMENT_AGE = 10 * 60
+
+logger = logging.getLogger(__name__)
+
+
+def _telemetry_root():
+    return settings.TELEMETRY_ROOT
+
+
+class SegmentWriter:
+    """Append-only writer of fixed-size telemetry records.
+
+    Each process appends to its own ``.open`` segment, locked with flock
+    while it is written; the segment is sealed (renamed to ``.seg``) once
+    it is too big, or by a timer thread once it is ``max_age`` seconds old
+    even if the process has gone idle. Only sealed segments are read by
+    the rollup.
+    """
+
+    def __init__(self, max_bytes=SEGMENT_MAX_BYTES, max_age=SEGMENT_MAX_AGE):
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._fd = None
+        self._path = None
+        self._opened_at = 0
+        self._size = 0
+        self._timer = None
+
+    def append(self, records):
+        """Append (kind, child_id, activity_id, timestamp, a, b) tuples in one write"""
+        data = b''.join(RECORD.pack(*record) for record in records)
+        if not data:
+            return
+        with self._lock:
+            if self._fd is not None and (
+                self._size >= self.max_bytes or time.time() - self._opened_at >= self.max_age
+            ):
+                self._seal()
+            if self._fd is None:
+                self._open()
+            os.write(self._fd, data)
+            self._size += len(data)
+        self._ensure_timer()
+
+    def seal(self):
+        with self._lock:
+            self._seal()
+
+    def _ensure_timer(self):
+        if self._timer is None:
+            with self._lock:
+                if self._timer is None:
+                    self._timer = threading.Thread(target=self._run, name='telemetry-seal', daemon=True)
+                    self._timer.start()
+
+    def _run(self):
+        while True:
+            try:
+                with self._lock:
+                    # Réveil à l'échéance du segment ouvert, sinon après max_age
+                    wait = self.max_age
+                    if self._fd is not None:
+                        wait = self._opened_at + self.max_age - time.time()
+                        if wait <= 0:
+                            self._seal()
+                            wait = self.max_age
+            except Exception:
+                logger.exception("Échec du scellement du segment de télémétrie %s", self._path)
+                wait = self.max_age
+            time.sleep(wait)
+
+    def _open(self):
+        root = _telemetry_root()
+        os.makedirs(root, exist_ok=True)
+        self._path = os.path.join(root, f"{time.time_ns()}-{os.getpid()}.open")
+        self._fd = os.open(self._path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        # Verrou tenu jusqu'au scellement : le balayage des orphelins ne touche pas ce segment
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        self._opened_at = time.time()
+        self._size = 0
+
+    def _seal(self):
+        if self._fd is None:
+            return
+        fd, path, size = self._fd, self._path, self._size
+        # Oublier le segment avant tout : un échec ici ne laisse pas de descripteur fermé en place
+        self._fd = None
+        self._path = None
+        os.close(fd)
+        try:
+            if size:
+                os.replace(path, path[:-len('.open')] + '.seg')
+            else:
+                os.remove(path)
+        except FileNotFoundError:
+            # Déjà scellé par un balayage des orphelins
+            pass
+
+
+segment_writer = SegmentWriter()
+atexit.register(segment_writer.seal)
+
+
+def record_events(events):
+    """Append play-session events ({kind, child, activity, ...}) to the segment log"""
+    now = time.time()
+    records = []
+    for event in events:
+        kind = EVENT_KINDS[event['kind']]
+        if kind == EVENT_ANSWER:
+            values = (1 if event.get('correct') else 0, 0)
+        elif kind == EVENT_FINISH:
+            values = (event.get('stars', 0), event.get('completion', 0))
+        elif kind == EVENT_TIME:
+            values = (event.get('seconds', 0), 0)
+        else:
+            values = (0, 0)
+        records.append((kind, event['child'], event['activity'], event.get('timestamp', now)) + values)
+    segment_writer.append(records)
+    return len(records)
+
+
+def iter_segment(path):
+    """Yield the records of a sealed segment through a read-only memory map"""
+    size = os.path.getsize(path)
+    if size < RECORD.size:
+        return
+    with open(path, 'rb') as handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        # Un enregistrement tronqué en fin de fichier est ignoré
+        yield from RECORD.iter_unpack(data[:size - size % RECORD.size])
+
+
+def _seal_orphans(root):
+    """Seal ``.open`` segments left behind by dead processes.
+
+    A live writer holds a flock on its segment, so only segments whose
+    lock can be taken are sealed.
+    """
+    cutoff = time.time() - ORPHAN_SEGMENT_AGE
+    for path in glob.glob(os.path.join(root, '*.open')):
+        try:
+            if os.path.getmtime(path) >= cutoff:
+                continue
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            continue
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            # Segment encore ouvert par un processus vivant (simplement inactif)
+            continue
+        else:
+            try:
+                os.replace(path, path[:-len('.open')] + '.seg')
+            except FileNotFoundError:
+                pass
+        finally:
+            os.close(fd)
+
+
+def _empty_totals():
+    return {
+        'sessions': 0,
+        'answers': 0,
+        'correct': 0,
+        'seconds': 0,
+        'stars': 0,
+        'completion': 0,
+    }
+
+
+def aggregate_segments(paths):
+    """Fold segment records into totals keyed by (child, activity, date)"""
+    totals = {}
+    for path in paths:
+        for kind, child_id, activity_id, timestamp, a, b in iter_segment(path):
+            day = datetime.fromtimestamp(timestamp, tz=timezone.get_current_timezone()).date()
+            entry = totals.setdefault((child_id, activity_id, day), _empty_totals())
+            if kind == EVENT_START:
+                entry['sessions'] += 1
+            elif kind == EVENT_ANSWER:
+                entry['answers'] += 1
+                entry['correct'] += a
+            elif kind == EVENT_FINISH:
+                entry['stars'] = max(entry['stars'], a)
+                entry['completion'] = max(entry['completion'], min(b, 100))
+            elif kind == EVENT_TIME:
+                entry['seconds'] += a
+    return totals
+
+
+def _progress_categories(activities):
+    """ProgressCategory matching each ActivityCategory by name, created when missing"""
+    by_name = {category.name: category for category in ProgressCategory.objects.all()}
+    for activity in activities.values():
+        name = activity.category.name
+        if name not in by_name:
+            by_name[name] = ProgressCategory.objects.create(
+                name=name,
+                color=activity.category.color,
+                icon=activity.category.icon
+            )
+    return by_name
+
+
+def _write_activity_records(totals, activities):
+    categories = _progress_categories(activities)
+    for (child_id, activity_id, day), entry in totals.items():
+        if not entry['sessions'] and not entry['answers'] and not entry['seconds']:
+            continue
+        activity = activities[activity_id]
+        record, _ = ActivityRecord.objects.get_or_create(
+            child_id=child_id,
+            title=activity.title,
+            category=categories[activity.category.name],
+            date=day,
+            defaults={'duration': 0, 'score': 0, 'max_score': 0}
+        )
+        if not record.duration_seconds:
+            # Ligne saisie hors télémétrie : partir de sa durée en minutes
+            record.duration_seconds = record.duration * 60
+        record.duration_seconds += entry['seconds']
+        record.duration = math.ceil(record.duration_seconds / 60)
+        if entry['answers']:
+            record.score += entry['correct']
+            record.max_score += entry['answers']
+        elif not record.max_score:
+            # Activité sans questions : note sur 10 d'après la complétion
+            record.score = round(entry['completion'] / 10)
+            record.max_score = 10
+        record.save(update_fields=['duration', 'duration_seconds', 'score', 'max_score'])
+
+
+def _write_course_progress(pairs):
+    """Refresh course-level ChildProgress of the touched (child, course) pairs"""
+    for child_id, course in pairs:
+        completed = ChildActivityProgress.objects.filter(
+            child_id=child_id,
+            activity__module__course=course,
+            completion_rate__gte=100
+        ).count()
+        total = course.activities_count
+        progress, _ = ChildProgress.objects.get_or_create(
+            child_id=child_id,
+            course=course,
+            category=None,
+            skill=None
+        )
+        progress.activities_completed = completed
+        progress.overall_progress = round(completed * 100 / total, 2) if total else 0
+        progress.progress = round(progress.overall_progress)
+        progress.status = 'completed' if total and completed >= total else 'in_progress'
+        progress.save()
+
+
+def _remove_segments(paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def rollup_segments():
+    """Aggregate every sealed segment into the progress tables, then delete them.
+
+    Returns the number of segments processed. Segments are only removed
+    once the database transaction has committed.
+    """
+    root = _telemetry_root()
+    if not os.path.isdir(root):
+        return 0
+    _seal_orphans(root)
+    paths = sorted(glob.glob(os.path.join(root, '*.seg')))
+    if not paths:
+        return 0
+
+    totals = aggregate_segments(paths)
+    activities = InteractiveActivity.objects.select_related('category', 'module__course').in_bulk(
+        {activity_id for _, activity_id, _ in totals}
+    )
+    # Ignorer les activités supprimées depuis l'enregistrement
+    totals = {key: entry for key, entry in totals.items() if key[1] in activities}
+
+    finished = {}
+    for (child_id, activity_id, _), entry in totals.items():
+        if entry['stars'] or entry['completion']:
+            stars, completion = finished.get((child_id, activity_id), (0, 0))
+            finished[(child_id, activity_id)] = (max(stars, entry['stars']), max(completion, entry['completion']))
+
+    with transaction.atomic():
+        if finished:
+            write_progress(finished)
+        _write_activity_records(totals, activities)
+        _write_course_progress({
+            (child_id, activities[activity_id].module.course)
+            for child_id, activity_id in finished
+        })
+        transaction.on_commit(lambda: _remove_segments(paths))
+
+    return len(paths)
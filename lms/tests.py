@@ -1,3 +1,36 @@
+from datetime import date
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
 
-# Create your tests here.
+from .ingest import ProgressBuffer
+from .models import ActivityCategory, ChildActivityProgress, Course, InteractiveActivity, Module
+
+
+class ProgressBufferTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.child = User.objects.create(username='child')
+        self.gone = User.objects.create(username='gone')
+        course = Course.objects.create(
+            title='Couleurs', teacher=User.objects.create(username='teacher'), description='',
+            level='PS', duration=30, start_date=date.today()
+        )
+        module = Module.objects.create(course=course, title='Module 1', order=1, description='')
+        self.activity = InteractiveActivity.objects.create(
+            module=module, category=ActivityCategory.objects.create(name='Jeux'),
+            title='Quiz', description='', activity_type='quiz', order=1,
+            estimated_time=5, url='https://example.com/quiz'
+        )
+
+    def test_flush_skips_reports_of_deleted_children(self):
+        buffer = ProgressBuffer(interval=3600, max_pending=10)
+        buffer.add(self.child.pk, self.activity.pk, 2, 100)
+        buffer.add(self.gone.pk, self.activity.pk, 3, 50)
+        self.gone.delete()
+
+        buffer.flush()
+
+        self.assertEqual(len(buffer), 0)
+        progress = ChildActivityProgress.objects.get()
+        self.assertEqual((progress.child_id, progress.stars_earned), (self.child.pk, 2))
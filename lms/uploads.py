@@ -0,0 +1,113 @@
+# lms/uploads.py
+
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .models import UploadSession
+from .services import attach_submitted_file
+
+READ_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """Invalid chunk or session state; ``offset`` tells the client where to resume"""
+
+    def __init__(self, message, offset=None):
+        super().__init__(message)
+        self.offset = offset
+
+
+def session_path(session):
+    return os.path.join(settings.CHUNKED_UPLOAD_ROOT, f"{session.pk}.part")
+
+
+def create_session(submission, user, filename, total_size):
+    """Open an upload session and reserve its partial file on disk"""
+    if total_size < 0 or total_size > settings.CHUNKED_UPLOAD_MAX_FILE_SIZE:
+        raise UploadError("Taille de fichier invalide")
+
+    session = UploadSession.objects.create(
+        submission=submission,
+        created_by=user,
+        filename=os.path.basename(filename)[:255],
+        total_size=total_size
+    )
+    os.makedirs(settings.CHUNKED_UPLOAD_ROOT, exist_ok=True)
+    open(session_path(session), 'wb').close()
+    return session
+
+
+def write_chunk(session_id, offset, stream, length):
+    """Write ``length`` bytes read from ``stream`` at ``offset``, returning the new offset.
+
+    Only the next expected offset is accepted, so a client resumes by
+    asking for the session's current offset and sending from there.
+    Memory use is bounded by READ_SIZE whatever the chunk or file size.
+    """
+    if length > settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE:
+        raise UploadError("Morceau trop volumineux")
+
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session_id)
+        if session.status != 'open':
+            raise UploadError("Session terminée", session.received)
+        if offset != session.received or offset + length > session.total_size:
+            raise UploadError("Décalage inattendu", session.received)
+
+        written = 0
+        with open(session_path(session), 'r+b') as part:
+            part.seek(offset)
+            while written < length:
+                data = stream.read(min(READ_SIZE, length - written))
+                if not data:
+                    break
+                part.write(data)
+                written += len(data)
+
+        # Un morceau interrompu est simplement réécrit à la reprise
+        if written != length:
+            raise UploadError("Morceau incomplet", session.received)
+
+        session.received = offset + written
+        session.save(update_fields=['received', 'updated_at'])
+    return session.received
+
+
+def complete_session(session_id):
+    """Assemble a fully received upload into the submission as a SubmittedFile"""
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().select_related('submission').get(pk=session_id)
+        if session.status == 'complete':
+            return session.submitted_file
+        if session.received != session.total_size:
+            raise UploadError("Téléversement incomplet", session.received)
+
+        path = session_path(session)
+        with open(path, 'rb') as part:
+            upload = File(part, name=session.filename)
+            upload.size = session.total_size
+            submitted_file = attach_submitted_file(session.submission, upload)
+
+        session.status = 'complete'
+        session.submitted_file = submitted_file
+        session.save(update_fields=['status', 'submitted_file', 'updated_at'])
+        transaction.on_commit(lambda: os.remove(path))
+    return submitted_file
+
+
+def purge_stale_sessions(max_age=timedelta(days=2)):
+    """Delete open sessions idle for longer than ``max_age`` and their partial files"""
+    stale = UploadSession.objects.filter(status='open', updated_at__lt=timezone.now() - max_age)
+    count = 0
+    for session in stale:
+        path = session_path(session)
+        if os.path.exists(path):
+            os.remove(path)
+        session.delete()
+        count += 1
+    return count
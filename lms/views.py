@@ -1,5 +1,5 @@
 from django.shortcuts import render,get_object_or_404
-from django.db.models import Count, Prefetch, Sum
+from django.db.models import Avg, Count, Exists, OuterRef, Prefetch, Q, Sum
 from django.views.generic import DetailView
 from .models import Course, Module, Resource, InteractiveActivity, ChildProgress, ChildProfile, User, CourseCategory, Assignment
 from django.contrib.auth.mixins import LoginRequiredMixin
@@ -7,41 +7,32 @@ from django.views.generic import ListView, TemplateView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import FormView
 from django.urls import reverse_lazy
-from .models import Assignment, AssignmentSubmission, SubmittedFile
+from .models import Assignment, AssignmentSubmission, SubmittedFile, UploadSession
 from .forms import AssignmentSubmissionForm
 from django.contrib import messages
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from datetime import datetime
 from .models import ActivityCategory, InteractiveActivity, ChildActivityProgress
 from .models import ChildProfile, ProgressCategory, ChildProgress, ActivityRecord, Milestone, Reward
+from .services import (
+    attach_submitted_file, get_activities_with_progress, get_category_progress, get_child_rank,
+    get_cohort_averages, get_group_leaderboard, get_user_progress
+)
+from .cache import get_course_tree
+from .uploads import UploadError, complete_session, create_session, write_chunk
+from django.conf import settings
+from django.http import JsonResponse
+from django.views import View
+from django.http import Http404
+from LMSapp.core.media import serve_protected_file
+from LMSapp.enrollment.models import ClassGroup
+from .ingest import progress_buffer
+from .telemetry import EVENT_KINDS, record_events
+import json
 
 
 # Create your views here.
 
-def get_user_progress(user):
-    """Get progress data for authenticated users"""
-    if not user.is_authenticated:
-        return None
-        
-    return {
-        'completed': user.enrollments.filter(status='completed').count(),
-        'total': Course.objects.count(),
-        'badges': 8,
-        'total_badges': 20,
-        'activities': 26,
-        'total_activities': 40
-    }
-
-def get_course_modules(course):
-    """Prefetch modules with their related resources and activities"""
-    modules_prefetch = Prefetch(
-        'modules',
-        queryset=Module.objects.prefetch_related(
-            Prefetch('resources', queryset=Resource.objects.all()),
-            Prefetch('activities', queryset=InteractiveActivity.objects.all())
-        ).order_by('order')
-    )
-    
-    return Course.objects.prefetch_related(modules_prefetch).get(pk=course.pk)
-
 def get_child_progress(user, course):
     """Get child progress for parent users"""
     if not user.is_parent:
@@ -54,12 +45,41 @@ def get_child_progress(user, course):
     ).select_related('child')
 
 def get_assignment_stats(queryset):
-    """Get assignment statistics"""
+    """Get assignment statistics in a single conditional aggregate"""
+    return queryset.order_by().aggregate(
+        total_assignments=Count('id'),
+        pending_count=Count('id', filter=Q(status='pending')),
+        submitted_count=Count('id', filter=Q(status='submitted')),
+        completed_count=Count('id', filter=Q(status='completed'))
+    )
+
+def encode_assignment_cursor(assignment):
+    """Opaque cursor pointing after an assignment in (-due_date, -id) order"""
+    raw = f"{assignment.due_date.isoformat()}|{assignment.pk}"
+    return urlsafe_base64_encode(raw.encode())
+
+def decode_assignment_cursor(cursor):
+    """(due_date, id) from a cursor, None if it is missing or malformed"""
+    try:
+        due_date, pk = urlsafe_base64_decode(cursor).decode().split('|')
+        return datetime.fromisoformat(due_date), int(pk)
+    except (TypeError, ValueError):
+        return None
+
+def get_assignment_page(queryset, cursor, page_size):
+    """Keyset page of assignments ordered by (-due_date, -id)"""
+    queryset = queryset.order_by('-due_date', '-id')
+    position = decode_assignment_cursor(cursor) if cursor else None
+    if position:
+        due_date, pk = position
+        queryset = queryset.filter(Q(due_date__lt=due_date) | Q(due_date=due_date, id__lt=pk))
+    
+    assignments = list(queryset[:page_size + 1])
+    has_next = len(assignments) > page_size
+    assignments = assignments[:page_size]
     return {
-        'total_assignments': queryset.count(),
-        'pending_count': queryset.filter(status='pending').count(),
-        'submitted_count': queryset.filter(status='submitted').count(),
-        'completed_count': queryset.filter(status='completed').count()
+        'assignments': assignments,
+        'next_cursor': encode_assignment_cursor(assignments[-1]) if has_next else None
     }
 
 def get_active_child(user, child_id=None):
@@ -71,59 +91,13 @@ def get_active_child(user, child_id=None):
         return User.objects.get(id=child_id)
     return user.children.first()
 
-def get_activities_with_progress(activities, active_child):
-    """Get activities with progress data"""
-    activities_with_progress = []
-    
-    for activity in activities:
-        progress = None
-        if active_child:
-            try:
-                progress = ChildActivityProgress.objects.get(
-                    child=active_child, 
-                    activity=activity
-                )
-            except ChildActivityProgress.DoesNotExist:
-                progress = ChildActivityProgress(
-                    child=active_child,
-                    activity=activity,
-                    stars_earned=0,
-                    completion_rate=0
-                )
-        activities_with_progress.append({
-            'activity': activity,
-            'progress': progress
-        })
-    
-    return activities_with_progress
-
-def get_category_progress(categories, activities, active_child):
-    """Get progress by category"""
-    category_progress = {}
-    
-    for category in categories:
-        if active_child:
-            category_activities = activities.filter(category=category)
-            completed = ChildActivityProgress.objects.filter(
-                child=active_child,
-                activity__in=category_activities,
-                completion_rate=100
-            ).count()
-            total = category_activities.count()
-            progress = round((completed / total) * 100) if total > 0 else 0
-        else:
-            progress = 0
-        category_progress[category.name] = progress
-    
-    return category_progress
-
 # View functions and classes
 def course_list(request):
-    # Récupérer tous les cours
-    courses = Course.objects.all().order_by('-created_at')
+    # Récupérer tous les cours (compteurs de contenu dénormalisés sur Course)
+    courses = list(Course.objects.all().order_by('-created_at'))
     
-    # Récupérer les catégories avec le nombre de cours
-    categories = CourseCategory.objects.annotate(course_count=Count('course'))
+    # Récupérer les catégories avec le nombre de cours (compteur maintenu)
+    categories = CourseCategory.objects.all()
     
     # Get progress data
     progress = get_user_progress(request.user)
@@ -131,7 +105,7 @@ def course_list(request):
     context = {
         'courses': courses,
         'categories': categories,
-        'courses_count': courses.count(),
+        'courses_count': len(courses),
         'progress': progress
     }
     return render(request, 'lms/course_list.html', context)
@@ -153,8 +127,8 @@ class CourseDetailView(LoginRequiredMixin, DetailView):
         context = super().get_context_data(**kwargs)
         course = self.object
         
-        # Prefetch modules with relations
-        course = get_course_modules(course)
+        # Arbre des modules (cache partagé, invalidé par signaux)
+        course_tree = get_course_tree(course)
         
         # Get child progress
         child_progress = get_child_progress(self.request.user, course)
@@ -167,7 +141,7 @@ class CourseDetailView(LoginRequiredMixin, DetailView):
         }
         
         context.update({
-            'modules': course.modules.all(),
+            'modules': course_tree['modules'],
             'progress': progress,
             'child_progress': child_progress
         })
@@ -179,14 +153,19 @@ class AssignmentListView(LoginRequiredMixin, ListView):
     model = Assignment
     template_name = 'lms/assignment_list.html'
     context_object_name = 'assignments'
+    page_size = 25
     
     def get_queryset(self):
         queryset = super().get_queryset()
         
-        # Filtrer par enfants (pour les parents)
+        # Filtrer par enfants (pour les parents) sans jointure ni distinct()
         if self.request.user.is_parent:
-            children = self.request.user.children.all()
-            queryset = queryset.filter(children__in=children).distinct()
+            queryset = queryset.filter(Exists(
+                Assignment.children.through.objects.filter(
+                    assignment_id=OuterRef('pk'),
+                    user__child_profile__parent=self.request.user
+                )
+            ))
         
         # Filtrer par statut
         status = self.request.GET.get('status')
@@ -198,14 +177,17 @@ class AssignmentListView(LoginRequiredMixin, ListView):
         if course_id:
             queryset = queryset.filter(course_id=course_id)
             
-        return queryset.prefetch_related('children').order_by('-due_date')
+        return queryset.prefetch_related('children')
     
     def get_context_data(self, **kwargs):
+        # Pagination par curseur (due_date, id) au lieu de OFFSET
+        page = get_assignment_page(self.object_list, self.request.GET.get('cursor'), self.page_size)
+        kwargs['object_list'] = page['assignments']
         context = super().get_context_data(**kwargs)
         
         # Get assignment statistics
-        assignments = self.get_queryset()
-        context.update(get_assignment_stats(assignments))
+        context.update(get_assignment_stats(self.object_list))
+        context['next_cursor'] = page['next_cursor']
         
         return context
 
@@ -241,15 +223,10 @@ class AssignmentSubmitView(FormView):
         submission.status = 'draft' if 'save_draft' in self.request.POST else 'submitted'
         submission.save()
         
-        # Gestion des fichiers
+        # Gestion des fichiers (stockage dédupliqué par empreinte)
         files = self.request.FILES.getlist('files')
         for file in files:
-            SubmittedFile.objects.create(
-                submission=submission,
-                file=file,
-                original_filename=file.name,
-                file_size=file.size
-            )
+            attach_submitted_file(submission, file)
         
         # Message de succès
         if submission.status == 'submitted':
@@ -276,15 +253,13 @@ class InteractiveActivitiesView(LoginRequiredMixin, TemplateView):
         activities = InteractiveActivity.objects.all()
         activities_with_progress = get_activities_with_progress(activities, active_child)
         
-        # Calculer la progression par catégorie
-        category_progress = get_category_progress(categories, activities, active_child)
-        
-        # Calculer le total des étoiles
+        # Calculer la progression par catégorie et le total des étoiles
+        category_progress = {}
         total_stars = 0
         if active_child:
-            total_stars = ChildActivityProgress.objects.filter(
-                child=active_child
-            ).aggregate(Sum('stars_earned'))['stars_earned__sum'] or 0
+            summary = get_category_progress(active_child)
+            category_progress = summary['categories']
+            total_stars = summary['total_stars']
         
         context.update({
             'active_child': active_child,
@@ -310,21 +285,22 @@ class ProgressTrackingView(LoginRequiredMixin, TemplateView):
             return context
         
         # Récupérer les données de progression
-        categories = ProgressCategory.objects.all()
-        progress_data = []
-        
-        for category in categories:
-            try:
-                progress = ChildProgress.objects.get(child=active_child, category=category)
-                progress_data.append({
-                    'category': category,
-                    'score': progress.score
-                })
-            except ChildProgress.DoesNotExist:
-                progress_data.append({
-                    'category': category,
-                    'score': 0
-                })
+        categories = list(ProgressCategory.objects.all())
+        category_names = [cat.name for cat in categories]
+        child_scores = dict(
+            ChildProgress.objects.filter(
+                child=active_child,
+                course__isnull=True,
+                category__in=category_names
+            ).values('category').annotate(avg_score=Avg('score')).values_list('category', 'avg_score')
+        )
+        progress_data = [
+            {
+                'category': category,
+                'score': round(child_scores.get(category.name) or 0)
+            }
+            for category in categories
+        ]
         
         # Récupérer les activités récentes
         recent_activities = ActivityRecord.objects.filter(child=active_child).order_by('-date')[:5]
@@ -337,21 +313,18 @@ class ProgressTrackingView(LoginRequiredMixin, TemplateView):
         total_stars = rewards.filter(reward_type='star').count()
         
         # Préparer les données pour les graphiques
-        category_names = [cat.name for cat in categories]
         scores = [item['score'] for item in progress_data]
         
-        # Comparaison avec le groupe (simulé)
-        group_avg = {
-            'Mathématiques': 75,
-            'Langage': 80,
-            'Arts': 85,
-            'Science': 70,
-            'Musique': 75
-        }
+        # Comparaison avec le groupe (moyennes matérialisées)
+        try:
+            child_profile = active_child.child_profile
+        except ChildProfile.DoesNotExist:
+            child_profile = None
+        group_avg = get_cohort_averages(child_profile, category_names)
         
         context.update({
             'active_child': active_child,
-            'child_profile': active_child.child_profile,
+            'child_profile': child_profile,
             'progress_data': progress_data,
             'recent_activities': recent_activities,
             'milestones': milestones,
@@ -361,4 +334,201 @@ class ProgressTrackingView(LoginRequiredMixin, TemplateView):
             'scores': scores,
             'group_avg': group_avg
         })
-        return context
\ No newline at end of file
+        return context
+
+class UploadSessionCreateView(LoginRequiredMixin, View):
+    """Ouvre une session de téléversement reprenable pour une soumission"""
+    
+    def post(self, request, submission_id):
+        submission = get_object_or_404(AssignmentSubmission, id=submission_id, submitted_by=request.user)
+        try:
+            total_size = int(request.POST.get('size', ''))
+            session = create_session(submission, request.user, request.POST.get('filename', 'fichier'), total_size)
+        except ValueError:
+            return JsonResponse({'error': "Taille de fichier invalide"}, status=400)
+        except UploadError as error:
+            return JsonResponse({'error': str(error)}, status=400)
+        
+        return JsonResponse({
+            'id': str(session.pk),
+            'offset': session.received,
+            'size': session.total_size,
+            'chunk_size': settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE
+        }, status=201)
+
+
+class UploadSessionView(LoginRequiredMixin, View):
+    """GET : décalage courant (reprise) ; PUT : morceau écrit au décalage Upload-Offset"""
+    
+    def get(self, request, session_id):
+        session = get_object_or_404(UploadSession, pk=session_id, created_by=request.user)
+        return JsonResponse({
+            'id': str(session.pk),
+            'offset': session.received,
+            'size': session.total_size,
+            'status': session.status
+        })
+    
+    def put(self, request, session_id):
+        get_object_or_404(UploadSession, pk=session_id, created_by=request.user)
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+            length = int(request.headers.get('Content-Length', ''))
+        except ValueError:
+            return JsonResponse({'error': "En-têtes Upload-Offset/Content-Length requis"}, status=400)
+        
+        try:
+            # Lecture en flux : la mémoire reste bornée par la taille de lecture
+            new_offset = write_chunk(session_id, offset, request, length)
+        except UploadError as error:
+            return JsonResponse({'error': str(error), 'offset': error.offset}, status=409)
+        return JsonResponse({'offset': new_offset})
+
+
+class UploadSessionCompleteView(LoginRequiredMixin, View):
+    """Assemble le fichier reçu et l'attache à la soumission"""
+    
+    def post(self, request, session_id):
+        get_object_or_404(UploadSession, pk=session_id, created_by=request.user)
+        try:
+            submitted_file = complete_session(session_id)
+        except UploadError as error:
+            return JsonResponse({'error': str(error), 'offset': error.offset}, status=409)
+        
+        return JsonResponse({
+            'file_id': submitted_file.pk,
+            'filename': submitted_file.original_filename,
+            'size': submitted_file.file_size,
+            'digest': submitted_file.digest
+        })
+
+
+class ResourceFileView(LoginRequiredMixin, View):
+    """Sert le fichier d'une ressource (vidéo, PDF) avec reprise par plages"""
+    
+    def get(self, request, pk):
+        resource = get_object_or_404(Resource, pk=pk)
+        if not resource.file:
+            raise Http404("Aucun fichier pour cette ressource")
+        return serve_protected_file(request, resource.file)
+
+
+def get_reportable_ids(user, child_ids, activity_ids):
+    """Children the user may report for and activities that exist, one query each"""
+    # Un parent ne rapporte que pour ses enfants, un enfant pour lui-même
+    allowed = set(
+        User.objects.filter(
+            Q(pk=user.pk) | Q(child_profile__parent=user),
+            pk__in=child_ids
+        ).values_list('pk', flat=True)
+    )
+    known_activities = set(
+        InteractiveActivity.objects.filter(pk__in=activity_ids).values_list('pk', flat=True)
+    )
+    return allowed, known_activities
+
+
+class ActivityProgressIngestView(LoginRequiredMixin, View):
+    """Reçoit des lots de progression des jeux ; les écritures sont regroupées en mémoire"""
+    
+    def post(self, request):
+        try:
+            events = json.loads(request.body)['events']
+            reports = [
+                (
+                    int(event['child']),
+                    int(event['activity']),
+                    max(int(event.get('stars', 0)), 0),
+                    min(max(int(event.get('completion', 0)), 0), 100)
+                )
+                for event in events
+            ]
+        except (ValueError, KeyError, TypeError):
+            return JsonResponse({'error': "Lot d'événements invalide"}, status=400)
+        
+        allowed, known_activities = get_reportable_ids(
+            request.user,
+            {report[0] for report in reports},
+            {report[1] for report in reports}
+        )
+        
+        accepted = 0
+        for child_id, activity_id, stars, completion in reports:
+            if child_id in allowed and activity_id in known_activities:
+                progress_buffer.add(child_id, activity_id, stars, completion)
+                accepted += 1
+        
+        return JsonResponse({
+            'accepted': accepted,
+            'rejected': len(reports) - accepted
+        }, status=202)
+
+
+class ActivityTelemetryView(LoginRequiredMixin, View):
+    """Journalise les événements de session de jeu (début, réponse, fin, durée) sur disque"""
+    
+    def post(self, request):
+        try:
+            events = [
+                {
+                    'kind': event['kind'],
+                    'child': int(event['child']),
+                    'activity': int(event['activity']),
+                    'correct': bool(event.get('correct')),
+                    'stars': max(int(event.get('stars', 0)), 0),
+                    'completion': min(max(int(event.get('completion', 0)), 0), 100),
+                    'seconds': min(max(int(event.get('seconds', 0)), 0), 24 * 60 * 60),
+                }
+                for event in json.loads(request.body)['events']
+                if event['kind'] in EVENT_KINDS
+            ]
+        except (ValueError, KeyError, TypeError):
+            return JsonResponse({'error': "Lot d'événements invalide"}, status=400)
+        
+        allowed, known_activities = get_reportable_ids(
+            request.user,
+            {event['child'] for event in events},
+            {event['activity'] for event in events}
+        )
+        events = [
+            event for event in events
+            if event['child'] in allowed and event['activity'] in known_activities
+        ]
+        
+        return JsonResponse({'accepted': record_events(events)}, status=202)
+
+
+class GroupLeaderboardView(LoginRequiredMixin, View):
+    """Classement des étoiles d'un groupe pour ses enseignants (top N et rang d'un enfant)"""
+    max_limit = 50
+    
+    def get(self, request, group_id):
+        groups = ClassGroup.objects.all() if request.user.is_staff else ClassGroup.objects.filter(teacher=request.user)
+        group = get_object_or_404(groups, pk=group_id)
+        try:
+            limit = min(max(int(request.GET.get('limit', 10)), 1), self.max_limit)
+        except ValueError:
+            limit = 10
+        
+        data = {
+            'group': group.name,
+            'leaderboard': [
+                {
+                    'rank': entry['rank'],
+                    'child': entry['child'].pk,
+                    'name': entry['child'].get_full_name() or entry['child'].username,
+                    'stars': entry['stars']
+                }
+                for entry in get_group_leaderboard(group, limit)
+            ]
+        }
+        
+        child_id = request.GET.get('child', '')
+        if child_id.isdigit():
+            rank = get_child_rank(int(child_id))
+            # Ne pas divulguer le rang d'un enfant d'un autre groupe
+            data['child_rank'] = rank if rank and User.objects.filter(
+                pk=child_id, child_profile__group=group
+            ).exists() else None
+        
+        return JsonResponse(data)
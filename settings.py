@@ -153,6 +153,40 @@ CONTACT_EMAIL = 'contact@garderie-scolaire.fr'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Cache partagé entre les workers (arbres de cours, statistiques)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+    }
+}
+
+# Médias protégés : stockés hors de MEDIA_ROOT, servis seulement après contrôle d'accès
+PROTECTED_MEDIA_ROOT = os.path.join(BASE_DIR, 'protected_media')
+# None (Django sert les octets), 'xsendfile' ou 'accel' (nginx, location interne sur PROTECTED_MEDIA_ROOT)
+MEDIA_SENDFILE_MODE = None
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+
+# Téléversements reprenables (fichiers partiels hors de MEDIA_ROOT)
+CHUNKED_UPLOAD_ROOT = os.path.join(BASE_DIR, 'upload_sessions')
+CHUNKED_UPLOAD_MAX_CHUNK_SIZE = 5 * 1024 * 1024
+CHUNKED_UPLOAD_MAX_FILE_SIZE = 2 * 1024 * 1024 * 1024
+
+# Regroupement des rapports de progression des jeux (secondes, nombre de clés)
+PROGRESS_FLUSH_INTERVAL = 5
+PROGRESS_FLUSH_MAX_PENDING = 500
+
+# Compteurs ContentAnalytics écrits en différé (secondes, nombre de lignes)
+ANALYTICS_FLUSH_INTERVAL = 10
+ANALYTICS_FLUSH_MAX_PENDING = 1000
+
+# Journal de télémétrie des activités (segments en ajout seul, agrégés par rollup_telemetry)
+TELEMETRY_ROOT = os.path.join(BASE_DIR, 'telemetry')
+
+# Importations d'utilisateurs (lignes par lot, lignes entre deux mises à jour des compteurs)
+USER_IMPORT_BATCH_SIZE = 1000
+USER_IMPORT_PROGRESS_EVERY = 1000
+
 # Configuration d'authentification
 LOGIN_URL = '/accounts/login/'
 LOGIN_REDIRECT_URL = '/'
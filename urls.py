@@ -48,6 +48,7 @@ urlpatterns = [
     path("admin/course/<int:course_id>/delete/", admin_views.delete_course, name="delete_course"),
     path("admin/course/<int:course_id>/status/", admin_views.change_course_status, name="change_course_status"),
     path("admin/lesson/<int:lesson_id>/", admin_views.lesson_detail, name="lesson_detail"),
+    path("admin/resource/<int:resource_id>/file/", admin_views.resource_file, name="admin_resource_file"),
     path("admin/content/analytics/", admin_views.content_analytics, name="content_analytics"),
     path("admin/enrollment/", admin_views.enrollment_admin, name="enrollment_admin"),
     path("admin/enrollment/<int:enrollment_id>/status/", admin_views.update_enrollment_status, name="update_enrollment_status"),
@@ -76,12 +77,19 @@ urlpatterns = [
     path("children/<int:child_id>/deactivate/", enroll_views.deactivate_child, name="deactivate_child"),
     path("children/<int:child_id>/activate/", enroll_views.activate_child, name="activate_child"),
     path("classes/", enroll_views.class_groups, name="class_groups"),
+    path("classes/<int:group_id>/leaderboard/", lms_views.GroupLeaderboardView.as_view(), name="group_leaderboard"),
 
     # --- LMS ---
     path("courses/", lms_views.course_list, name="course_list"),
     path("courses/<int:pk>/", lms_views.CourseDetailView.as_view(), name="course_detail"),
+    path("resources/<int:pk>/file/", lms_views.ResourceFileView.as_view(), name="resource_file"),
     path("assignments/", lms_views.AssignmentListView.as_view(), name="assignment_list"),
     path("assignments/<int:pk>/submit/", lms_views.AssignmentSubmitView.as_view(), name="assignment_submit"),
+    path("submissions/<int:submission_id>/uploads/", lms_views.UploadSessionCreateView.as_view(), name="upload_session_create"),
+    path("uploads/<uuid:session_id>/", lms_views.UploadSessionView.as_view(), name="upload_session"),
+    path("uploads/<uuid:session_id>/complete/", lms_views.UploadSessionCompleteView.as_view(), name="upload_session_complete"),
     path("activities/", lms_views.InteractiveActivitiesView.as_view(), name="interactive_activities"),
+    path("activities/progress/", lms_views.ActivityProgressIngestView.as_view(), name="activity_progress_ingest"),
+    path("activities/telemetry/", lms_views.ActivityTelemetryView.as_view(), name="activity_telemetry"),
     path("progress/", lms_views.ProgressTrackingView.as_view(), name="progress_tracking"),
 ]